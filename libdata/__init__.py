@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 
+from libdata.cache import *
+from libdata.codec import *
 from libdata.common import *
+from libdata.keys import *
 from libdata.json import *
 from libdata.jsonl import *
 from libdata.json_dir import *
 from libdata.yaml_dir import *
+from libdata.shard import *
 from libdata.mongodb import *
+from libdata.mongodb_async import *
 # from libdata.mysql import *
 # from libdata.redis import *
 # from libdata.milvus import *
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+__author__ = "xi"
+__all__ = [
+    "Cache",
+    "LRUCache",
+    "LFUCache",
+    "TTLCache",
+    "create_cache",
+    "pop_cache_params",
+    "estimate_size",
+]
+
+import sys
+import time
+from collections import OrderedDict, defaultdict
+from threading import Lock
+from typing import Any, Dict, Hashable, MutableMapping, Optional
+
+DEFAULT_MAX_ENTRIES = 1 << 16
+CACHE_PARAMS = ("cache_policy", "cache_size", "cache_bytes", "cache_ttl")
+
+MISSING = object()
+
+
+def estimate_size(obj, _seen=None) -> int:
+    """Estimate the memory size (in bytes) of a document, including the nested containers."""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += estimate_size(key, _seen) + estimate_size(value, _seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += estimate_size(item, _seen)
+    return size
+
+
+class Cache:
+    """Abstract class for bounded caches.
+
+    A cache is capped by the number of entries (max_entries), the estimated size of the values (max_bytes), or both.
+    None means no limit. The counters (hits, misses, evictions) can be read with stats().
+    All methods are thread safe.
+    """
+
+    def __init__(self, max_entries: Optional[int] = DEFAULT_MAX_ENTRIES, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.num_bytes = 0
+
+        self._lock = Lock()
+        self._sizes: Dict[Hashable, int] = {}
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._lookup(key) is not MISSING
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            if value is MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._touch(key)
+            return value
+
+    def put(self, key, value):
+        size = estimate_size(value) if self.max_bytes is not None else 0
+        with self._lock:
+            if key in self._sizes:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                # A value larger than the whole cache is never cached.
+                return
+            # Entries are evicted before inserting, so that the new entry itself is never the victim.
+            while self._sizes and self._is_full(size):
+                self._remove(self._victim())
+                self.evictions += 1
+            self._insert(key, value)
+            self._sizes[key] = size
+            self.num_bytes += size
+
+    def pop(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            if value is MISSING:
+                return default
+            self._remove(key)
+            return value
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._sizes):
+                self._remove(key)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._sizes),
+                "bytes": self.num_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _is_full(self, size: int) -> bool:
+        """Check if there is no room for a new entry of the given size."""
+        if self.max_entries is not None and len(self._sizes) >= self.max_entries:
+            return True
+        if self.max_bytes is not None and self.num_bytes + size > self.max_bytes:
+            return True
+        return False
+
+    def _remove(self, key):
+        self.num_bytes -= self._sizes.pop(key)
+        self._discard(key)
+
+    def _lookup(self, key) -> Any:
+        """Return the value of the key, or MISSING."""
+        raise NotImplementedError()
+
+    def _touch(self, key):
+        """Record an access of the key."""
+        raise NotImplementedError()
+
+    def _insert(self, key, value):
+        raise NotImplementedError()
+
+    def _discard(self, key):
+        raise NotImplementedError()
+
+    def _victim(self) -> Hashable:
+        """The key to be evicted next."""
+        raise NotImplementedError()
+
+
+class LRUCache(Cache):
+    """Evict the least recently used entry first."""
+
+    def __init__(self, max_entries: Optional[int] = DEFAULT_MAX_ENTRIES, max_bytes: Optional[int] = None):
+        super().__init__(max_entries, max_bytes)
+        self._data = OrderedDict()
+
+    def _lookup(self, key):
+        return self._data.get(key, MISSING)
+
+    def _touch(self, key):
+        self._data.move_to_end(key)
+
+    def _insert(self, key, value):
+        self._data[key] = value
+
+    def _discard(self, key):
+        del self._data[key]
+
+    def _victim(self):
+        return next(iter(self._data))
+
+
+class LFUCache(Cache):
+    """Evict the least frequently used entry first, and the least recently used one among equally used entries.
+    Entries are grouped by their access counts, so that all operations take constant time.
+    """
+
+    def __init__(self, max_entries: Optional[int] = DEFAULT_MAX_ENTRIES, max_bytes: Optional[int] = None):
+        super().__init__(max_entries, max_bytes)
+        self._data = {}
+        self._counts = {}
+        self._groups: MutableMapping[int, OrderedDict] = defaultdict(OrderedDict)
+        self._min_count = 0
+
+    def _lookup(self, key):
+        return self._data.get(key, MISSING)
+
+    def _touch(self, key):
+        count = self._counts[key]
+        group = self._groups[count]
+        del group[key]
+        if not group:
+            del self._groups[count]
+            if self._min_count == count:
+                self._min_count = count + 1
+        self._counts[key] = count + 1
+        self._groups[count + 1][key] = None
+
+    def _insert(self, key, value):
+        self._data[key] = value
+        self._counts[key] = 1
+        self._groups[1][key] = None
+        self._min_count = 1
+
+    def _discard(self, key):
+        del self._data[key]
+        count = self._counts.pop(key)
+        group = self._groups[count]
+        del group[key]
+        if not group:
+            del self._groups[count]
+            if self._min_count == count:
+                self._min_count = min(self._groups) if self._groups else 0
+
+    def _victim(self):
+        return next(iter(self._groups[self._min_count]))
+
+
+class TTLCache(LRUCache):
+    """Entries expire ttl seconds after they are put.
+    Expired entries are treated as misses, and are dropped before evicting the least recently used entries.
+    """
+
+    def __init__(
+            self,
+            ttl: float,
+            max_entries: Optional[int] = DEFAULT_MAX_ENTRIES,
+            max_bytes: Optional[int] = None
+    ):
+        super().__init__(max_entries, max_bytes)
+        self.ttl = ttl
+        self._expires = OrderedDict()
+
+    def _lookup(self, key):
+        expire = self._expires.get(key)
+        if expire is not None and expire <= time.monotonic():
+            self._remove(key)
+            return MISSING
+        return super()._lookup(key)
+
+    def _insert(self, key, value):
+        super()._insert(key, value)
+        self._expires[key] = time.monotonic() + self.ttl
+
+    def _discard(self, key):
+        super()._discard(key)
+        del self._expires[key]
+
+    def _victim(self):
+        # Entries are put with the same ttl, so the first one in insertion order expires first.
+        key, expire = next(iter(self._expires.items()))
+        if expire <= time.monotonic():
+            return key
+        return super()._victim()
+
+
+def create_cache(
+        policy: str = "lru",
+        max_entries: Optional[int] = DEFAULT_MAX_ENTRIES,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None
+) -> Cache:
+    """Create a cache by its eviction policy ("lru", "lfu" or "ttl")."""
+    policy = policy.lower()
+    if policy == "lru":
+        return LRUCache(max_entries, max_bytes)
+    elif policy == "lfu":
+        return LFUCache(max_entries, max_bytes)
+    elif policy == "ttl":
+        if ttl is None:
+            raise ValueError("ttl should be given for the \"ttl\" policy.")
+        return TTLCache(ttl, max_entries, max_bytes)
+    raise ValueError(f"Unsupported cache policy \"{policy}\".")
+
+
+def pop_cache_params(params: MutableMapping[str, str]) -> Dict[str, Any]:
+    """Pop the cache parameters of a URL, and convert them to the arguments of create_cache().
+    URL example: mongo://host/db/coll?use_cache=true&cache_policy=lfu&cache_size=10000&cache_bytes=1073741824
+    """
+    kwargs = {}
+    if "cache_policy" in params:
+        kwargs["policy"] = params.pop("cache_policy")
+    if "cache_size" in params:
+        size = int(params.pop("cache_size"))
+        kwargs["max_entries"] = size if size > 0 else None
+    if "cache_bytes" in params:
+        size = int(params.pop("cache_bytes"))
+        kwargs["max_bytes"] = size if size > 0 else None
+    if "cache_ttl" in params:
+        kwargs["ttl"] = float(params.pop("cache_ttl"))
+    return kwargs
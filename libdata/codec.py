@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+__author__ = "xi"
+__all__ = [
+    "JSONCodec",
+    "StdJSONCodec",
+    "ORJSONCodec",
+    "UJSONCodec",
+    "MsgspecCodec",
+    "register_codec",
+    "set_default_codec",
+    "get_codec",
+]
+
+import codecs
+import json
+import sys
+from typing import Dict, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+class JSONCodec:
+    """Abstract class for JSON codecs.
+    Codecs decode from and encode to UTF-8 bytes directly, so that the str round-trip can be skipped.
+    """
+
+    name = None
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    def loads(self, data: Union[bytes, str]):
+        raise NotImplementedError()
+
+    def dumps(self, obj, indent: Optional[int] = None) -> bytes:
+        raise NotImplementedError()
+
+
+class StdJSONCodec(JSONCodec):
+    """Codec based on the "json" module of the standard library."""
+
+    name = "json"
+
+    def loads(self, data: Union[bytes, str]):
+        return json.loads(data)
+
+    def dumps(self, obj, indent: Optional[int] = None) -> bytes:
+        return json.dumps(obj, indent=indent).encode("utf-8")
+
+
+class ORJSONCodec(JSONCodec):
+    """Codec based on "orjson".
+    Note that orjson only supports an indent of 2 spaces, any other positive indent is treated as 2.
+    """
+
+    name = "orjson"
+
+    @classmethod
+    def available(cls) -> bool:
+        return orjson is not None
+
+    def loads(self, data: Union[bytes, str]):
+        return orjson.loads(data)
+
+    def dumps(self, obj, indent: Optional[int] = None) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+
+
+class UJSONCodec(JSONCodec):
+    """Codec based on "ujson"."""
+
+    name = "ujson"
+
+    @classmethod
+    def available(cls) -> bool:
+        return ujson is not None
+
+    def loads(self, data: Union[bytes, str]):
+        return ujson.loads(data)
+
+    def dumps(self, obj, indent: Optional[int] = None) -> bytes:
+        return ujson.dumps(obj, indent=indent or 0, escape_forward_slashes=False).encode("utf-8")
+
+
+class MsgspecCodec(JSONCodec):
+    """Codec based on "msgspec"."""
+
+    name = "msgspec"
+
+    @classmethod
+    def available(cls) -> bool:
+        return msgspec is not None
+
+    def loads(self, data: Union[bytes, str]):
+        return msgspec.json.decode(data)
+
+    def dumps(self, obj, indent: Optional[int] = None) -> bytes:
+        data = msgspec.json.encode(obj)
+        return msgspec.json.format(data, indent=indent) if indent else data
+
+
+CODECS: Dict[str, type[JSONCodec]] = {
+    "json": StdJSONCodec,
+    "orjson": ORJSONCodec,
+    "ujson": UJSONCodec,
+    "msgspec": MsgspecCodec,
+}
+
+_default_codec = "json"
+_codec_instances: Dict[str, JSONCodec] = {}
+
+
+def register_codec(name: str, codec_class: type[JSONCodec]):
+    if not (isinstance(codec_class, type) and issubclass(codec_class, JSONCodec)):
+        raise TypeError(f"Expect a subclass of JSONCodec, got \"{codec_class}\".")
+    CODECS[name] = codec_class
+    _codec_instances.pop(name, None)
+
+
+def set_default_codec(name: str):
+    if name not in CODECS:
+        raise ValueError(f"Unsupported codec \"{name}\".")
+    global _default_codec
+    _default_codec = name
+
+
+def get_codec(codec: Union[str, JSONCodec, None] = None) -> JSONCodec:
+    """Get a codec by its name. None means the default codec.
+    If the package of the codec is not installed, the codec of the standard library is returned.
+    """
+    if isinstance(codec, JSONCodec):
+        return codec
+
+    name = codec or _default_codec
+    if (instance := _codec_instances.get(name)) is not None:
+        return instance
+
+    if name not in CODECS:
+        raise ValueError(f"Unsupported codec \"{name}\".")
+    codec_class = CODECS[name]
+    if not codec_class.available():
+        print(f"Codec \"{name}\" is not available, fall back to \"json\".", file=sys.stderr)
+        codec_class = StdJSONCodec
+    instance = _codec_instances[name] = codec_class()
+    return instance
+
+
+def is_utf8(encoding: str) -> bool:
+    return codecs.lookup(encoding).name == "utf-8"
@@ -10,13 +10,22 @@ __all__ = [
 
 import abc
 import importlib
+import sys
+import time
 from collections import defaultdict, deque
-from threading import Lock
-from typing import Generic, Optional, TypeVar, Union
-
+from concurrent.futures import ThreadPoolExecutor
+from queue import Full, Queue
+from threading import Condition, Event, Lock
+from typing import (
+    Any, Callable, Deque, Dict, Generic, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, TypeVar, Union
+)
+
+from libdata.metrics import MetricsCallback, PoolMetrics
 from libdata.url import URL
 
 ITERATORS = {
+    "json": "libdata.jsonl.JSONLIterator",
+    "jsonl": "libdata.jsonl.JSONLIterator",
     "mongo": "libdata.mongodb.MongoIterator",
     "mongodb": "libdata.mongodb.MongoIterator",
     "mysql": "libdata.mysql.MySQLIterator",
@@ -67,6 +76,118 @@ class DocIterator(abc.ABC):
         self.close()
 
 
+def parse_partition_params(
+        params: Optional[Mapping[str, str]],
+        partitions: int = 1,
+        rank: int = 0,
+        world_size: int = 1
+) -> Tuple[int, int, int]:
+    """Read partitions, rank and world_size (worldSize) from the parameters of a URL, and validate them."""
+    if params:
+        if "partitions" in params:
+            partitions = int(params["partitions"])
+        if "rank" in params:
+            rank = int(params["rank"])
+        if "world_size" in params:
+            world_size = int(params["world_size"])
+        elif "worldSize" in params:
+            world_size = int(params["worldSize"])
+
+    if partitions < 1:
+        raise ValueError("partitions should be at least 1.")
+    if not 0 <= rank < world_size:
+        raise ValueError(f"rank should be in [0, {world_size}).")
+    return partitions, rank, world_size
+
+
+def ranges_from_bounds(bounds: Iterable) -> List[Tuple[Any, Any]]:
+    """Turn sorted split keys into ranges [lower, upper), where None means unbounded.
+    Duplicate keys are dropped, so there can be fewer ranges than keys + 1.
+    """
+    keys = []
+    for key in bounds:
+        if not keys or keys[-1] < key:
+            keys.append(key)
+    keys = [None, *keys, None]
+    return list(zip(keys[:-1], keys[1:]))
+
+
+def select_ranges(
+        split: Callable[[int], List[Tuple[Any, Any]]],
+        partitions: int,
+        rank: int,
+        world_size: int
+) -> List[Tuple[Any, Any]]:
+    """Split the key space into partitions * world_size ranges by split(n), and select the ranges of this worker.
+    The list is empty if there are fewer ranges than workers.
+    """
+    if partitions * world_size == 1:
+        return [(None, None)]
+    return split(partitions * world_size)[rank::world_size]
+
+
+class _RangeEnd:
+    """Marker put into the queue when the scan of a key range ends."""
+
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+
+def merge_range_scans(
+        ranges: Sequence[Tuple[Any, Any]],
+        scan: Callable[[Any, Any], Iterable],
+        queue_size: int = 4096
+) -> Iterator:
+    """Scan the ranges in parallel, each by a thread calling scan(lower, upper), and yield the items as they arrive.
+    scan() should open its own connection, e.g., by returning a generator that uses a new pooled client.
+    An error of any scan is raised to the consumer. Closing the returned generator stops all scans.
+    """
+    if not ranges:
+        return
+    queue = Queue(queue_size)
+    stop = Event()
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _run(lower, upper):
+        error = None
+        try:
+            items = scan(lower, upper)
+            try:
+                for item in items:
+                    if not _put(item):
+                        return
+            finally:
+                if hasattr(items, "close"):
+                    items.close()
+        except Exception as e:
+            error = e
+        _put(_RangeEnd(error))
+
+    with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+        for lower, upper in ranges:
+            executor.submit(_run, lower, upper)
+        try:
+            num_running = len(ranges)
+            while num_running > 0:
+                item = queue.get()
+                if isinstance(item, _RangeEnd):
+                    num_running -= 1
+                    if item.error is not None:
+                        raise item.error
+                    continue
+                yield item
+        finally:
+            stop.set()
+
+
 class DocReader(abc.ABC):
     """Abstract class for document readers."""
 
@@ -83,14 +204,18 @@ class DocReader(abc.ABC):
             "mongo": "libdata.mongodb.MongoReader",
             "mongodb": "libdata.mongodb.MongoReader",
             "mysql": "libdata.mysql.MySQLReader",
+            "shards": "libdata.shard.ShardedReader",
             "yamldir": "libdata.json_dir.YAMLDirReader",
             "ymldir": "libdata.json_dir.YAMLDirReader",
         }
 
-        if url.scheme not in factory:
+        name = factory.get(url.scheme)
+        if name is None and url.scheme and url.path:
+            # Files on a remote file system are read by their extensions, e.g., "s3+http://host/bucket/data.jsonl".
+            name = cls._reader_by_extension(url.path)
+        if name is None:
             raise ValueError(f"Unsupported type \"{url.scheme}\".")
 
-        name = factory.get(url.scheme)
         try:
             module, reader_class = name.rsplit(".", 1)
             reader_class = getattr(importlib.import_module(module), reader_class)
@@ -100,6 +225,23 @@ class DocReader(abc.ABC):
         assert isinstance(reader_class, type) and issubclass(reader_class, DocReader)
         return reader_class.from_url(url)
 
+    @staticmethod
+    def _reader_by_extension(path: str) -> Optional[str]:
+        extensions = {
+            ".jsonl": "libdata.jsonl.JSONLReader",
+            ".json": "libdata.json.JSONReader",
+            ".yaml": "libdata.json.JSONReader",
+            ".yml": "libdata.json.JSONReader",
+        }
+        # JSONL files can be compressed.
+        for suffix in ("", ".gz", ".gzip", ".zst", ".zstd", ".lz4"):
+            if path.endswith(".jsonl" + suffix):
+                return extensions[".jsonl"]
+        for ext, name in extensions.items():
+            if path.endswith(ext):
+                return name
+        return None
+
     def __iter__(self):
         return (self[idx] for idx in range(len(self)))
 
@@ -175,14 +317,20 @@ ClientType = TypeVar("ClientType")
 
 
 class LazyClient(Generic[ClientType]):
+    """Client that connects on first use.
+    Subclasses usually check out the connection from a ConnectionPool in _connect(), and return it in _disconnect().
+    """
 
     def __init__(self):
         self._client = None
+        self._connect_lock = Lock()
 
     @property
     def client(self) -> ClientType:
         if self._client is None:
-            self._client = self._connect()
+            with self._connect_lock:
+                if self._client is None:
+                    self._client = self._connect()
         return self._client
 
     def close(self):
@@ -209,16 +357,85 @@ class LazyClient(Generic[ClientType]):
     def _disconnect(self, client: ClientType):
         raise NotImplementedError()
 
+    def _get_pool(self) -> Tuple[Optional["ConnectionPool"], Any]:
+        """The connection pool and the key of the client in the pool."""
+        return None, None
+
+    def stats(self) -> Dict[str, Any]:
+        """The stats of the connections of the client (see ConnectionPool.stats())."""
+        pool, key = self._get_pool()
+        result = pool.stats(key)[key] if pool is not None else {}
+        result["connected"] = self._client is not None
+        return result
+
 
 ConnType = TypeVar("ConnType")
 
 
-class ConnectionPool(Generic[ConnType]):
+class _PoolEntry:
+    __slots__ = ("conn", "close", "created_at", "released_at", "acquired_at")
+
+    def __init__(self, conn, close: Optional[Callable] = None):
+        self.conn = conn
+        self.close = close
+        self.created_at = time.monotonic()
+        self.released_at = self.created_at
+        self.acquired_at = self.created_at
 
-    def __init__(self, max_size: int):
+
+class ConnectionPool(Generic[ConnType]):
+    """Pool of connections (clients), grouped by key (usually the connection URL).
+
+    Connections are checked out by acquire(), which reuses an idle connection of the key or creates a new one, and are
+    returned by release(), or dropped by discard() if they are broken.
+    max_size: The maximum number of idle connections kept per key.
+    max_connections: The hard cap of connections (idle and in use) per key. When the cap is reached, acquire() waits
+        for a connection to be released, and raises TimeoutError after timeout seconds. None means no cap.
+    idle_timeout: Idle connections are closed after this number of seconds. None means never.
+    max_lifetime: Connections are closed after this number of seconds since they were created. None means never.
+    pre_ping: Check an idle connection with the ping hook of its backend before reusing it.
+
+    Metrics (see PoolMetrics) are collected after enable_metrics() is called, and are reported by stats().
+    When metrics are disabled, the pool only pays for a None check per event.
+
+    get() and put() are kept for compatibility, connections got by them are not counted by the pool.
+    """
+
+    def __init__(
+            self,
+            max_size: int,
+            max_connections: Optional[int] = None,
+            timeout: Optional[float] = None,
+            idle_timeout: Optional[float] = None,
+            max_lifetime: Optional[float] = None,
+            pre_ping: bool = True
+    ):
         self._max_size = max_size
-        self.pools = defaultdict(deque)
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.pre_ping = pre_ping
+
+        self.pools: Dict[Any, Deque[_PoolEntry]] = defaultdict(deque)
         self.lock = Lock()
+        self._cond = Condition(self.lock)
+        self._in_use: Dict[int, Tuple[Any, _PoolEntry]] = {}
+        self._num_conns: Dict[Any, int] = defaultdict(int)
+        self._num_created: Dict[Any, int] = defaultdict(int)
+        self._num_closed: Dict[Any, int] = defaultdict(int)
+        self.metrics: Optional[PoolMetrics] = None
+
+    def enable_metrics(self, callback: Optional[MetricsCallback] = None) -> PoolMetrics:
+        """Start collecting metrics. callback(kind, name, value, key) receives each event if given."""
+        if self.metrics is None:
+            self.metrics = PoolMetrics(callback)
+        else:
+            self.metrics.callback = callback
+        return self.metrics
+
+    def disable_metrics(self):
+        self.metrics = None
 
     @property
     def max_size(self):
@@ -229,17 +446,225 @@ class ConnectionPool(Generic[ConnType]):
         with self.lock:
             self._max_size = value
 
+    def _is_expired(self, entry: _PoolEntry, now: float) -> bool:
+        if self.max_lifetime is not None and now - entry.created_at >= self.max_lifetime:
+            return True
+        if self.idle_timeout is not None and now - entry.released_at >= self.idle_timeout:
+            return True
+        return False
+
+    def _pop_idle(self, key, expired: List[Tuple[Any, _PoolEntry]]) -> Optional[_PoolEntry]:
+        # Called with the lock held. Expired connections are collected to be closed after the lock is released.
+        pool = self.pools[key]
+        now = time.monotonic()
+        while pool:
+            entry = pool.pop()
+            if not self._is_expired(entry, now):
+                return entry
+            self._num_conns[key] -= 1
+            expired.append((key, entry))
+        return None
+
+    def _close_entries(self, entries: List[Tuple[Any, _PoolEntry]]):
+        for key, entry in entries:
+            with self.lock:
+                self._num_closed[key] += 1
+            if self.metrics is not None:
+                self.metrics.incr(key, "closes")
+            _close_conn(entry.conn, entry.close)
+
+    def acquire(
+            self,
+            key,
+            create: Callable[[], ConnType],
+            close: Optional[Callable[[ConnType], Any]] = None,
+            ping: Optional[Callable[[ConnType], Any]] = None,
+            timeout: Optional[float] = None
+    ) -> ConnType:
+        """Check out a connection of the key.
+
+        create: Create a new connection.
+        close: Close a connection, conn.close() is called if not given.
+        ping: The pre-ping hook, which returns False or raises an error if a connection is broken.
+        timeout: The timeout of waiting for a connection, the timeout of the pool is used if not given.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start_time = time.monotonic()
+        deadline = None if timeout is None else start_time + timeout
+        while True:
+            expired = []
+            entry = None
+            with self._cond:
+                while True:
+                    entry = self._pop_idle(key, expired)
+                    if entry is not None:
+                        break
+                    if self.max_connections is None or self._num_conns[key] < self.max_connections:
+                        self._num_conns[key] += 1
+                        break
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        if self.metrics is not None:
+                            self.metrics.incr(key, "timeouts")
+                        raise TimeoutError(f"Timeout waiting for a connection of \"{key}\".")
+                    self._cond.wait(remaining)
+            self._close_entries(expired)
+
+            if entry is None:
+                try:
+                    entry = _PoolEntry(create(), close)
+                except BaseException:
+                    self._forget(key)
+                    raise
+                with self.lock:
+                    self._num_created[key] += 1
+                if self.metrics is not None:
+                    self.metrics.incr(key, "creations")
+                    self.metrics.incr(key, "misses")
+            elif self.pre_ping and ping is not None and not _ping_conn(entry.conn, ping):
+                if self.metrics is not None:
+                    self.metrics.incr(key, "discards")
+                self._forget(key)
+                self._close_entries([(key, entry)])
+                continue
+            elif self.metrics is not None:
+                self.metrics.incr(key, "hits")
+
+            entry.acquired_at = time.monotonic()
+            with self.lock:
+                self._in_use[id(entry.conn)] = (key, entry)
+            if self.metrics is not None:
+                self.metrics.incr(key, "acquisitions")
+                self.metrics.observe(key, "wait_time", entry.acquired_at - start_time)
+                self.metrics.add_in_use(key, 1)
+            return entry.conn
+
+    def _forget(self, key):
+        with self._cond:
+            self._num_conns[key] -= 1
+            self._cond.notify()
+
+    def release(self, key, conn: ConnType):
+        """Return a connection checked out by acquire()."""
+        to_close = None
+        with self._cond:
+            _, entry = self._in_use.pop(id(conn), (key, None))
+            adopted = entry is None
+            if adopted:
+                # The connection was not created by the pool, it's adopted.
+                entry = _PoolEntry(conn)
+                self._num_conns[key] += 1
+            entry.released_at = time.monotonic()
+            if self.metrics is not None and adopted is False:
+                self.metrics.observe(key, "checkout_time", entry.released_at - entry.acquired_at)
+                self.metrics.add_in_use(key, -1)
+            pool = self.pools[key]
+            if len(pool) < self._max_size and not self._is_expired(entry, entry.released_at):
+                pool.append(entry)
+            else:
+                self._num_conns[key] -= 1
+                to_close = entry
+            self._cond.notify()
+        if to_close is not None:
+            self._close_entries([(key, to_close)])
+
+    def discard(self, key, conn: ConnType):
+        """Close a broken connection checked out by acquire(), instead of returning it to the pool."""
+        with self._cond:
+            _, entry = self._in_use.pop(id(conn), (key, None))
+            if entry is not None:
+                self._num_conns[key] -= 1
+                self._cond.notify()
+        if self.metrics is not None:
+            self.metrics.incr(key, "discards")
+            if entry is not None:
+                self.metrics.observe(key, "checkout_time", time.monotonic() - entry.acquired_at)
+                self.metrics.add_in_use(key, -1)
+        self._close_entries([(key, entry if entry is not None else _PoolEntry(conn))])
+
+    def evict(self) -> int:
+        """Close the expired idle connections of all keys. Return the number of closed connections."""
+        expired = []
+        with self._cond:
+            now = time.monotonic()
+            for key, pool in self.pools.items():
+                kept = deque(entry for entry in pool if not self._is_expired(entry, now))
+                for entry in pool:
+                    if self._is_expired(entry, now):
+                        self._num_conns[key] -= 1
+                        expired.append((key, entry))
+                self.pools[key] = kept
+            self._cond.notify_all()
+        self._close_entries(expired)
+        return len(expired)
+
+    def clear(self):
+        """Close all idle connections."""
+        idle = []
+        with self._cond:
+            for key, pool in self.pools.items():
+                self._num_conns[key] -= len(pool)
+                idle.extend((key, entry) for entry in pool)
+            self.pools.clear()
+            self._cond.notify_all()
+        self._close_entries(idle)
+
+    def stats(self, key=None) -> Dict[Any, Dict[str, Any]]:
+        """The number of idle, in use, created and closed connections of each key (or the given key),
+        and the metrics if they are enabled.
+        """
+        with self.lock:
+            keys = [key] if key is not None else set(self._num_conns) | set(self.pools)
+            in_use = defaultdict(int)
+            for conn_key, _ in self._in_use.values():
+                in_use[conn_key] += 1
+            result = {
+                conn_key: {
+                    "idle": len(self.pools.get(conn_key, ())),
+                    "in_use": in_use[conn_key],
+                    "created": self._num_created.get(conn_key, 0),
+                    "closed": self._num_closed.get(conn_key, 0),
+                }
+                for conn_key in keys
+            }
+        if (metrics := self.metrics) is not None:
+            for conn_key, item in result.items():
+                item["metrics"] = metrics.stats(conn_key)
+        return result
+
     def get(self, key) -> Optional[ConnType]:
         with self.lock:
-            pool = self.pools[key]
-            if len(pool) > 0:
-                return pool.pop()
-            return None
+            expired = []
+            entry = self._pop_idle(key, expired)
+            if entry is not None:
+                self._num_conns[key] -= 1
+        self._close_entries(expired)
+        return entry.conn if entry is not None else None
 
     def put(self, key, conn: ConnType) -> Optional[ConnType]:
-        with self.lock:
+        with self._cond:
             pool = self.pools[key]
             if len(pool) < self._max_size:
-                pool.append(conn)
+                pool.append(_PoolEntry(conn))
+                self._num_conns[key] += 1
                 return None
             return conn
+
+
+def _close_conn(conn, close: Optional[Callable] = None):
+    # noinspection PyBroadException
+    try:
+        if close is not None:
+            close(conn)
+        elif hasattr(conn, "close"):
+            conn.close()
+    except Exception as e:
+        print(f"Failed to close connection: {e}", file=sys.stderr)
+
+
+def _ping_conn(conn, ping: Callable) -> bool:
+    # noinspection PyBroadException
+    try:
+        return ping(conn) is not False
+    except Exception:
+        return False
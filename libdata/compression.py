@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+__author__ = "xi"
+__all__ = [
+    "get_compression",
+    "decompress_stream",
+    "compress_stream",
+    "SeekableZstdReader",
+    "SeekableZstdWriter",
+]
+
+import gzip
+import io
+import struct
+from typing import BinaryIO, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+COMPRESSION_EXTENSIONS = {
+    ".gz": "gzip",
+    ".gzip": "gzip",
+    ".zst": "zstd",
+    ".zstd": "zstd",
+    ".lz4": "lz4",
+}
+
+DEFAULT_FRAME_SIZE = 1 << 20
+DEFAULT_READ_BUFFER_SIZE = 1 << 20
+
+# See https://github.com/facebook/zstd/blob/dev/contrib/seekable_format/zstd_seekable_compression_format.md
+SKIPPABLE_MAGIC = 0x184D2A5E
+SEEKABLE_MAGIC = 0x8F92EAB1
+SEEK_TABLE_FOOTER_SIZE = 9
+
+
+def get_compression(path: str, compression: Optional[str] = None) -> Optional[str]:
+    """Get the compression method of a file.
+    The method is given explicitly by compression ("none" means no compression), or detected by the file extension.
+    """
+    if compression:
+        compression = compression.lower()
+        if compression == "none":
+            return None
+        if compression not in COMPRESSION_EXTENSIONS.values():
+            raise ValueError(f"Unsupported compression \"{compression}\".")
+        return compression
+
+    for ext, compression in COMPRESSION_EXTENSIONS.items():
+        if path.endswith(ext):
+            return compression
+    return None
+
+
+def _require(compression: str):
+    if compression == "zstd" and zstandard is None:
+        raise RuntimeError("\"zstandard\" should be installed to access zstd compressed files.")
+    if compression == "lz4" and lz4_frame is None:
+        raise RuntimeError("\"lz4\" should be installed to access lz4 compressed files.")
+
+
+def decompress_stream(fp: BinaryIO, compression: Optional[str]) -> BinaryIO:
+    """Wrap a binary file for sequential decompressed reading.
+    Closing the returned stream doesn't close fp.
+    """
+    if compression is None:
+        return fp
+    _require(compression)
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=fp, mode="rb")
+    elif compression == "zstd":
+        reader = zstandard.ZstdDecompressor().stream_reader(fp, read_across_frames=True, closefd=False)
+        return io.BufferedReader(reader, buffer_size=DEFAULT_READ_BUFFER_SIZE)
+    elif compression == "lz4":
+        return lz4_frame.LZ4FrameFile(fp, mode="rb")
+    raise ValueError(f"Unsupported compression \"{compression}\".")
+
+
+def compress_stream(fp: BinaryIO, compression: Optional[str], level: Optional[int] = None) -> BinaryIO:
+    """Wrap a binary file for compressed writing.
+    zstd streams are written in the seekable format, so that they can be randomly accessed by SeekableZstdReader.
+    Closing the returned stream doesn't close fp.
+    """
+    if compression is None:
+        return fp
+    _require(compression)
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=fp, mode="wb", compresslevel=9 if level is None else level)
+    elif compression == "zstd":
+        return SeekableZstdWriter(fp, level=3 if level is None else level)
+    elif compression == "lz4":
+        return lz4_frame.LZ4FrameFile(fp, mode="wb", compression_level=0 if level is None else level)
+    raise ValueError(f"Unsupported compression \"{compression}\".")
+
+
+class SeekableZstdWriter(io.RawIOBase):
+    """Write data as independent zstd frames followed by a seek table.
+    Frames are cut at line boundaries when possible, so that reading a line usually decompresses only one frame.
+    """
+
+    def __init__(self, fp: BinaryIO, level: int = 3, frame_size: int = DEFAULT_FRAME_SIZE):
+        super().__init__()
+        _require("zstd")
+        self.fp = fp
+        self.frame_size = frame_size
+
+        self._cctx = zstandard.ZstdCompressor(level=level)
+        self._pending = bytearray()
+        self._frames: List[Tuple[int, int]] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._pending += data
+        while len(self._pending) >= self.frame_size:
+            end = self._pending.rfind(b"\n", 0, self.frame_size) + 1
+            self._write_frame(end if end > 0 else self.frame_size)
+        return len(data)
+
+    def _write_frame(self, size: int):
+        frame = self._cctx.compress(bytes(self._pending[:size]))
+        self.fp.write(frame)
+        self._frames.append((len(frame), size))
+        del self._pending[:size]
+
+    def flush(self):
+        # Data is only written in complete frames. The pending data is written when the stream is closed.
+        if not self.closed:
+            self.fp.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        if self._pending:
+            self._write_frame(len(self._pending))
+
+        table = bytearray()
+        for compressed_size, decompressed_size in self._frames:
+            table += struct.pack("<II", compressed_size, decompressed_size)
+        table += struct.pack("<IBI", len(self._frames), 0, SEEKABLE_MAGIC)
+        self.fp.write(struct.pack("<II", SKIPPABLE_MAGIC, len(table)))
+        self.fp.write(table)
+        self.fp.flush()
+        super().close()
+
+
+class SeekableZstdReader:
+    """Random access reader for zstd files in the seekable format."""
+
+    def __init__(self, fp: BinaryIO):
+        _require("zstd")
+        self.fp = fp
+
+        fp.seek(0, io.SEEK_END)
+        file_size = fp.tell()
+        if file_size < SEEK_TABLE_FOOTER_SIZE + 8:
+            raise ValueError("Not a seekable zstd file.")
+        fp.seek(file_size - SEEK_TABLE_FOOTER_SIZE)
+        num_frames, descriptor, magic = struct.unpack("<IBI", fp.read(SEEK_TABLE_FOOTER_SIZE))
+        if magic != SEEKABLE_MAGIC:
+            raise ValueError("Not a seekable zstd file.")
+
+        entry_size = 12 if descriptor & 0x80 else 8
+        table_size = num_frames * entry_size
+        fp.seek(file_size - SEEK_TABLE_FOOTER_SIZE - table_size)
+        table = np.frombuffer(fp.read(table_size), dtype="<u4").reshape((num_frames, entry_size // 4))
+
+        self.compressed_offsets = np.zeros((num_frames + 1,), dtype=np.uint64)
+        np.cumsum(table[:, 0], out=self.compressed_offsets[1:])
+        self.decompressed_offsets = np.zeros((num_frames + 1,), dtype=np.uint64)
+        np.cumsum(table[:, 1], out=self.decompressed_offsets[1:])
+
+        self._dctx = zstandard.ZstdDecompressor()
+        self._frame_idx = None
+        self._frame = None
+
+    def __len__(self):
+        return int(self.decompressed_offsets[-1])
+
+    def _read_frame(self, frame_idx: int) -> bytes:
+        if frame_idx != self._frame_idx:
+            start = int(self.compressed_offsets[frame_idx])
+            end = int(self.compressed_offsets[frame_idx + 1])
+            size = int(self.decompressed_offsets[frame_idx + 1] - self.decompressed_offsets[frame_idx])
+            self.fp.seek(start)
+            self._frame = self._dctx.decompressobj().decompress(self.fp.read(end - start))
+            if len(self._frame) != size:
+                raise RuntimeError(f"Frame {frame_idx} is corrupted.")
+            self._frame_idx = frame_idx
+        return self._frame
+
+    def __getitem__(self, item: slice) -> bytes:
+        """Read the decompressed data in range [item.start, item.stop)."""
+        start, stop = item.start, min(item.stop, len(self))
+        chunks = []
+        frame_idx = int(np.searchsorted(self.decompressed_offsets, start, side="right")) - 1
+        while start < stop:
+            frame = self._read_frame(frame_idx)
+            frame_start = int(self.decompressed_offsets[frame_idx])
+            chunk = frame[start - frame_start:stop - frame_start]
+            chunks.append(chunk)
+            start += len(chunk)
+            frame_idx += 1
+        return b"".join(chunks)
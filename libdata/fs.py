@@ -3,6 +3,8 @@
 __author__ = "xi"
 __all__ = [
     "filesystem",
+    "is_remote",
+    "split_parameters",
     "LazyFSClient",
     "listdir",
     "open",
@@ -14,7 +16,7 @@ __all__ = [
     "write_text",
 ]
 
-from typing import Optional, Union
+from typing import Dict, Iterable, Optional, Tuple, Union
 
 import fsspec
 from fsspec import AbstractFileSystem
@@ -60,6 +62,25 @@ def filesystem(url: Union[str, URL]) -> AbstractFileSystem:
     )
 
 
+def is_remote(path: Union[str, URL]) -> bool:
+    """Check if a path is the URL of a file system other than the local one, e.g., "s3+http://host:port/path"."""
+    if isinstance(path, str) and "://" not in path:
+        return False
+    schemes = URL.ensure_url(path).split_scheme()
+    return bool(schemes) and schemes[0] not in {"file", "local"}
+
+
+def split_parameters(url: Union[str, URL], names: Iterable[str]) -> Tuple[URL, Dict[str, str]]:
+    """Split the parameters of a URL.
+    The parameters in names are returned separately, and the others are kept in the returned URL.
+    This is used to separate the options of a reader from the options of the file system.
+    """
+    url = URL.ensure_url(url)
+    params = dict(url.parameters or {})
+    selected = {name: params.pop(name) for name in names if name in params}
+    return url.model_copy(update={"parameters": params}), selected
+
+
 class LazyFSClient(LazyClient[AbstractFileSystem]):
 
     @staticmethod
@@ -98,18 +119,20 @@ class LazyFSClient(LazyClient[AbstractFileSystem]):
         self.conn_pool = connection_pool if connection_pool else self.DEFAULT_CONN_POOL
 
     def _connect(self) -> AbstractFileSystem:
-        client = self.conn_pool.get(self.conn_url)
-        if client is None:
-            client = filesystem(self.conn_url)
-        return client
+        return self.conn_pool.acquire(self.conn_url, lambda: filesystem(self.conn_url), close=self._close_client)
+
+    @staticmethod
+    def _close_client(client: AbstractFileSystem):
+        if hasattr(client, "close"):
+            client.close()
+        elif hasattr(client, "disconnect"):
+            client.disconnect()
 
     def _disconnect(self, client: AbstractFileSystem):
-        client = self.conn_pool.put(self.conn_url, client)
-        if client is not None:
-            if hasattr(client, "close"):
-                client.close()
-            elif hasattr(client, "disconnect"):
-                client.disconnect()
+        self.conn_pool.release(self.conn_url, client)
+
+    def _get_pool(self):
+        return self.conn_pool, self.conn_url
 
     def join_path(self, path: Optional[str] = None):
         if path:
@@ -124,8 +147,26 @@ class LazyFSClient(LazyClient[AbstractFileSystem]):
         for item in self.client.listdir(self.join_path(path), detail=False):
             yield item
 
-    def open(self, path: Optional[str] = None, mode: str = "rb"):
-        return self.client.open(self.join_path(path), mode=mode)
+    def open(self, path: Optional[str] = None, mode: str = "rb", **kwargs):
+        return self.client.open(self.join_path(path), mode=mode, **kwargs)
+
+    def size(self, path: Optional[str] = None) -> int:
+        return self.client.size(self.join_path(path))
+
+    def isdir(self, path: Optional[str] = None) -> bool:
+        return self.client.isdir(self.join_path(path))
+
+    def find(self, path: Optional[str] = None, recursive: bool = True):
+        """List the files (not directories) under a path.
+        The returned paths are absolute in the file system, which can be opened by self.client directly.
+        """
+        if recursive:
+            return self.client.find(self.join_path(path))
+        return [
+            info["name"]
+            for info in self.client.ls(self.join_path(path), detail=True)
+            if info["type"] == "file"
+        ]
 
     def rm(self, path: Optional[str] = None, recursive=False):
         return self.client.rm(self.join_path(path), recursive=recursive)
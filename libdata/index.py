@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+
+__author__ = "xi"
+__all__ = [
+    "DirIndex",
+    "file_signature",
+    "dir_signature",
+    "scan_dir",
+    "read_index",
+    "write_index",
+]
+
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".idx"
+
+
+def file_signature(path: str) -> Dict[str, int]:
+    """The signature used to check if a file has been changed since its index was built."""
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def dir_signature(dir_path: str, sub_dirs) -> Optional[Dict[str, int]]:
+    """The signature of a directory tree, which contains the modification time of each (sub)directory.
+    Adding, removing or renaming a file changes the modification time of its parent directory.
+    Return None if any of the directories doesn't exist anymore.
+    """
+    signature = {}
+    for sub_dir in sub_dirs:
+        try:
+            signature[sub_dir] = os.stat(os.path.join(dir_path, sub_dir)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    return signature
+
+
+def _list_dir(dir_path: str) -> Tuple[int, List[str], List[str]]:
+    # The modification time is taken before listing, so that changes during the listing are detected next time.
+    mtime = os.stat(dir_path).st_mtime_ns
+    files = []
+    dirs = []
+    with os.scandir(dir_path) as it:
+        for entry in it:
+            # The file type comes from the directory entry, so no extra stat call is needed for most file systems.
+            if entry.is_dir():
+                dirs.append(entry.path)
+            else:
+                files.append(entry.path)
+    return mtime, files, dirs
+
+
+def scan_dir(
+        dir_path: str,
+        recursive: bool = True,
+        workers: Optional[int] = None
+) -> Tuple[List[str], Dict[str, int]]:
+    """List the files in a directory tree, with the sub-directories listed in parallel by a thread pool.
+    Return the sorted file list, and the signature of the directory tree (see dir_signature()).
+    """
+    file_list = []
+    signature = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(_list_dir, dir_path): dir_path}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                mtime, files, dirs = future.result()
+                signature[os.path.relpath(path, dir_path)] = mtime
+                file_list.extend(files)
+                if recursive:
+                    for sub_dir in dirs:
+                        pending[executor.submit(_list_dir, sub_dir)] = sub_dir
+    # Directories are listed in a nondeterministic order, sorting makes the indexes stable across processes.
+    file_list.sort()
+    return file_list, signature
+
+
+def read_index(index_path: str) -> Optional[Tuple[dict, Dict[str, np.ndarray]]]:
+    """Read a sidecar index file.
+    Return (meta, arrays), or None if the index doesn't exist or can't be used.
+    """
+    if not os.path.isfile(index_path):
+        return None
+
+    # noinspection PyBroadException
+    try:
+        with np.load(index_path, allow_pickle=False) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            arrays = {name: data[name] for name in data.files if name != "meta"}
+    except Exception:
+        # A broken index is simply rebuilt.
+        return None
+
+    if meta.get("version") != INDEX_VERSION:
+        return None
+    return meta, arrays
+
+
+def write_index(index_path: str, meta: Mapping, **arrays: np.ndarray) -> bool:
+    """Write a sidecar index file atomically, so that concurrent readers never see a partial index.
+    Return False if the index can't be written, e.g., the directory is read-only.
+    """
+    meta = {**meta, "version": INDEX_VERSION}
+    try:
+        meta = np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8)
+    except TypeError as e:
+        print(f"Failed to serialize index of \"{index_path}\": {e}", file=sys.stderr)
+        return False
+
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            np.savez(f, meta=meta, **arrays)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        print(f"Failed to write index \"{index_path}\": {e}", file=sys.stderr)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    return True
+
+
+class DirIndex:
+    """File list and key index of a directory of documents, shared by the directory readers.
+
+    With use_index, the file list and the key index are persisted to a sidecar file ("{dir_path}.idx")
+    next to the directory.
+    The file list is reused as long as no file is added, removed or renamed in the directory tree.
+    The keys are stored along with the size and modification time of their files, and when they are loaded,
+    only the keys of the files changed since then are read again.
+    The directory is listed, and the key index is built, by a pool of workers threads.
+    A given file_list (e.g., of a remote directory) is used as is, without sidecar file.
+    """
+
+    def __init__(
+            self,
+            dir_path: str,
+            recursive: bool = True,
+            use_index: bool = False,
+            workers: Optional[int] = None,
+            file_list: Optional[List[str]] = None
+    ) -> None:
+        self.dir_path = dir_path
+        self.recursive = recursive
+        self.use_index = use_index and file_list is None
+        self.workers = workers
+
+        self.file_list = []
+        self.index_path = os.path.normpath(self.dir_path) + INDEX_SUFFIX
+        self._signature = {}
+        self._key_field = None
+        self._key_index = None
+        self._file_signatures = None
+        self._stored = None
+        if file_list is not None:
+            self.file_list = file_list
+        elif not (self.use_index and self._load()):
+            self.file_list, self._signature = scan_dir(self.dir_path, self.recursive, self.workers)
+            if self.use_index:
+                self._save()
+
+    def _load(self) -> bool:
+        if (result := read_index(self.index_path)) is None:
+            return False
+        meta, arrays = result
+        if meta.get("recursive") != self.recursive:
+            return False
+        signature = meta.get("signature") or {}
+        if dir_signature(self.dir_path, signature.keys()) != signature:
+            return False
+
+        self._signature = signature
+        self.file_list = [os.path.join(self.dir_path, path) for path in meta["files"]]
+        keys = meta.get("keys")
+        sizes, mtimes = arrays.get("sizes"), arrays.get("mtimes")
+        if keys is not None and sizes is not None and mtimes is not None:
+            if len(keys) == len(sizes) == len(mtimes) == len(self.file_list):
+                self._stored = (meta.get("key_field"), keys, sizes, mtimes)
+        return True
+
+    def _save(self, key_list=None, file_signatures=None):
+        meta = {
+            "signature": self._signature,
+            "recursive": self.recursive,
+            "files": [os.path.relpath(path, self.dir_path) for path in self.file_list]
+        }
+        arrays = {}
+        if key_list is not None:
+            meta["key_field"] = self._key_field
+            meta["keys"] = key_list
+            arrays["sizes"] = np.array([sig["size"] for sig in file_signatures], dtype=np.int64)
+            arrays["mtimes"] = np.array([sig["mtime_ns"] for sig in file_signatures], dtype=np.int64)
+        write_index(self.index_path, meta, **arrays)
+
+    def _read_keys(self, read_key: Callable[[str], Any], key_list: Optional[list] = None) -> list:
+        """Read the keys of the files with a thread pool.
+        If the keys of a former scan are given, only the files changed since then are read again.
+        """
+        def _stat(path):
+            try:
+                return file_signature(path)
+            except FileNotFoundError:
+                return None
+
+        def _read(path):
+            # The signature is taken before reading, so that changes during the reading are detected next time.
+            signature = file_signature(path) if self.use_index else None
+            return read_key(path), signature
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            if key_list is None:
+                key_list = [None] * len(self.file_list)
+                changed = range(len(self.file_list))
+            else:
+                signatures = list(executor.map(_stat, self.file_list))
+                changed = [i for i, signature in enumerate(signatures) if signature != self._file_signatures[i]]
+                if not changed:
+                    return key_list
+                key_list = list(key_list)
+            if self._file_signatures is None:
+                self._file_signatures = [None] * len(self.file_list)
+            for i, (key, signature) in zip(changed, executor.map(_read, [self.file_list[i] for i in changed])):
+                key_list[i] = key
+                self._file_signatures[i] = signature
+
+        if self.use_index:
+            self._save(key_list, self._file_signatures)
+        return key_list
+
+    def find(self, key, key_field: str, read_key: Callable[[str], Any]) -> str:
+        """Find the file of the document whose key_field is the given key.
+        read_key(path) reads the key of a file, and is called to build the key index if it's not stored.
+        """
+        if self._key_index is None or self._key_field != key_field:
+            self._key_field = key_field
+            self._file_signatures = None
+            stored, self._stored = self._stored, None
+            key_list = None
+            if stored is not None and stored[0] == key_field:
+                _, key_list, sizes, mtimes = stored
+                self._file_signatures = [
+                    {"size": int(size), "mtime_ns": int(mtime)}
+                    for size, mtime in zip(sizes, mtimes)
+                ]
+            key_list = self._read_keys(read_key, key_list)
+            self._key_index = dict(zip(key_list, self.file_list))
+        return self._key_index[key]
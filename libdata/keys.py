@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+__author__ = "xi"
+__all__ = [
+    "KeyStore",
+    "KeyStoreBuilder",
+]
+
+from array import array
+from typing import Iterable, List, Optional, Union
+
+import numpy as np
+
+from libdata.index import read_index, write_index
+
+try:
+    from bson import ObjectId
+except ImportError:
+    ObjectId = None
+
+# Version of the layout written by KeyStore.save(). Files of other layouts are ignored by KeyStore.load().
+KEYS_LAYOUT = 2
+
+
+class KeyStore:
+    """Compact, read-only list of keys.
+
+    Keys are stored by their type, instead of as a list of Python objects:
+        "int": an int64 array,
+        "objectid": an (n, 12) uint8 array with the binary form of the ObjectIds,
+        "str": a UTF-8 buffer with the offsets of the keys,
+        "object": a plain list, used for any other (or mixed) key type.
+    Except "object" key stores, they can be saved to and loaded from disk.
+    """
+
+    def __init__(
+            self,
+            kind: str,
+            values: Union[np.ndarray, List, None] = None,
+            offsets: Optional[np.ndarray] = None
+    ):
+        if kind not in {"int", "objectid", "str", "object"}:
+            raise ValueError(f"Unsupported key kind \"{kind}\".")
+        if kind == "str" and offsets is None:
+            raise ValueError("offsets should be given for str keys.")
+        self.kind = kind
+        self.values = values if values is not None else []
+        self.offsets = offsets
+
+    @classmethod
+    def from_iterable(cls, keys: Iterable) -> "KeyStore":
+        """Build a key store by consuming the keys one by one, without holding them as Python objects."""
+        builder = KeyStoreBuilder()
+        for key in keys:
+            builder.append(key)
+        return builder.build()
+
+    @staticmethod
+    def _kind_of(key) -> str:
+        if isinstance(key, int) and not isinstance(key, bool) and -(1 << 63) <= key < (1 << 63):
+            return "int"
+        elif ObjectId is not None and isinstance(key, ObjectId):
+            return "objectid"
+        elif isinstance(key, str):
+            return "str"
+        return "object"
+
+    @staticmethod
+    def _pack(kind: str, ints: array, data: bytearray, offsets: array):
+        if kind == "int":
+            return np.frombuffer(ints, dtype=np.int64).copy(), None
+        elif kind == "objectid":
+            # Not an "S12" array, since numpy strips the trailing NUL bytes of "S" items.
+            return np.frombuffer(data, dtype=np.uint8).reshape(-1, 12).copy(), None
+        else:
+            return np.frombuffer(data, dtype=np.uint8).copy(), np.frombuffer(offsets, dtype=np.uint64).copy()
+
+    def __len__(self):
+        if self.kind == "str":
+            return len(self.offsets) - 1
+        return len(self.values)
+
+    def __getitem__(self, idx: int):
+        if self.kind == "int":
+            return int(self.values[idx])
+        elif self.kind == "objectid":
+            return ObjectId(bytes(self.values[idx]))
+        elif self.kind == "str":
+            if idx < 0:
+                idx += len(self)
+            if not 0 <= idx < len(self):
+                raise IndexError(f"Index {idx} is out of range.")
+            start, end = int(self.offsets[idx]), int(self.offsets[idx + 1])
+            return self.values[start:end].tobytes().decode("utf-8")
+        return self.values[idx]
+
+    def __iter__(self):
+        return (self[idx] for idx in range(len(self)))
+
+    @property
+    def nbytes(self) -> int:
+        """The memory size of the arrays (0 for "object" key stores)."""
+        if self.kind == "object":
+            return 0
+        return self.values.nbytes + (self.offsets.nbytes if self.offsets is not None else 0)
+
+    def save(self, path: str, **meta) -> bool:
+        """Save the keys to a file, with some metadata to validate the file when it is loaded.
+        Return False if the keys can't be saved.
+        """
+        if self.kind == "object":
+            return False
+        arrays = {"values": self.values}
+        if self.offsets is not None:
+            arrays["offsets"] = self.offsets
+        return write_index(path, {**meta, "kind": self.kind, "layout": KEYS_LAYOUT}, **arrays)
+
+    @classmethod
+    def load(cls, path: str, **meta) -> Optional["KeyStore"]:
+        """Load the keys from a file.
+        Return None if the file doesn't exist, or its metadata doesn't match the given one.
+        """
+        if (result := read_index(path)) is None:
+            return None
+        stored_meta, arrays = result
+        if stored_meta.get("layout") != KEYS_LAYOUT:
+            return None
+        if any(stored_meta.get(name) != value for name, value in meta.items()):
+            return None
+        if stored_meta.get("kind") == "objectid" and ObjectId is None:
+            return None
+        return cls(stored_meta["kind"], arrays["values"], arrays.get("offsets"))
+
+
+class KeyStoreBuilder:
+    """Build a KeyStore from keys appended one by one, e.g., keys read by an async cursor."""
+
+    def __init__(self):
+        self._kind = None
+        self._ints = array("q")
+        self._data = bytearray()
+        self._offsets = array("Q", [0])
+        self._objects = None
+
+    def append(self, key):
+        if self._objects is not None:
+            self._objects.append(key)
+            return
+
+        kind = KeyStore._kind_of(key)
+        if self._kind is None:
+            self._kind = kind
+        elif kind != self._kind:
+            # Mixed key types are kept as they are.
+            self._objects = list(self._pack())
+            self._objects.append(key)
+            return
+
+        if kind == "int":
+            self._ints.append(key)
+        elif kind == "objectid":
+            self._data += key.binary
+        elif kind == "str":
+            self._data += key.encode("utf-8")
+            self._offsets.append(len(self._data))
+        else:
+            self._objects = [key]
+
+    def _pack(self) -> KeyStore:
+        return KeyStore(self._kind, *KeyStore._pack(self._kind, self._ints, self._data, self._offsets))
+
+    def build(self) -> KeyStore:
+        if self._objects is not None:
+            return KeyStore("object", self._objects)
+        if self._kind is None:
+            return KeyStore("object", [])
+        return self._pack()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+__author__ = "xi"
+__all__ = [
+    "Histogram",
+    "PoolMetrics",
+]
+
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+from typing import Any, Callable, Dict, Optional, Sequence
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0, float("inf"))
+
+# callback(kind, name, value, key), where kind is one of "counter", "timing" and "gauge".
+MetricsCallback = Callable[[str, str, float, Any], None]
+
+_URL_PASSWORD = re.compile(r"(://[^/:@]*:)[^/@]*@")
+
+
+def mask_key(key):
+    """Hide the password in a key (connection URL), so that the key can be used as the label of a metric."""
+    if isinstance(key, str):
+        return _URL_PASSWORD.sub(r"\1***@", key)
+    return key
+
+
+class Histogram:
+    """Histogram of durations (in seconds) with fixed buckets, like the histograms of Prometheus."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        idx = bisect_left(self.buckets, value)
+        if idx < len(self.counts):
+            self.counts[idx] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The summary of the histogram, with cumulative bucket counts ("le" buckets of Prometheus)."""
+        cumulative = {}
+        total = 0
+        for bucket, count in zip(self.buckets, self.counts):
+            total += count
+            cumulative[str(bucket)] = total
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "max": self.max,
+            "buckets": cumulative,
+        }
+
+
+class PoolMetrics:
+    """Metrics of a ConnectionPool, grouped by the keys of the pool.
+
+    Counters:
+        acquisitions: Connections checked out.
+        hits: Checkouts served by idle connections.
+        misses: Checkouts that created new connections.
+        creations: Connections created.
+        discards: Connections dropped as broken (failed pre-ping or discard()).
+        closes: Connections closed (discarded, expired, or not kept as idle).
+        timeouts: Checkouts that timed out.
+    Histograms (seconds):
+        wait_time: Time waiting for a connection (including the creation of the connection).
+        checkout_time: Time a connection is checked out.
+    Gauges:
+        in_use: Connections currently checked out.
+
+    Each event is also passed to callback (if given), which can forward it to Prometheus, StatsD, etc.
+    The key passed to callback has its password masked.
+    """
+
+    COUNTERS = ("acquisitions", "hits", "misses", "creations", "discards", "closes", "timeouts")
+
+    def __init__(self, callback: Optional[MetricsCallback] = None, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.callback = callback
+        self.buckets = buckets
+
+        self._lock = Lock()
+        self._counters: Dict[Any, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(self.COUNTERS, 0))
+        self._histograms: Dict[Any, Dict[str, Histogram]] = defaultdict(lambda: {
+            "wait_time": Histogram(self.buckets),
+            "checkout_time": Histogram(self.buckets),
+        })
+        self._in_use: Dict[Any, int] = defaultdict(int)
+
+    def incr(self, key, name: str, value: int = 1):
+        with self._lock:
+            self._counters[key][name] += value
+        if self.callback is not None:
+            self.callback("counter", name, value, mask_key(key))
+
+    def observe(self, key, name: str, value: float):
+        with self._lock:
+            self._histograms[key][name].observe(value)
+        if self.callback is not None:
+            self.callback("timing", name, value, mask_key(key))
+
+    def add_in_use(self, key, delta: int):
+        with self._lock:
+            self._in_use[key] += delta
+            value = self._in_use[key]
+        if self.callback is not None:
+            self.callback("gauge", "in_use", value, mask_key(key))
+
+    def stats(self, key) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._counters[key],
+                "in_use": self._in_use[key],
+                **{name: hist.to_dict() for name, hist in self._histograms[key].items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
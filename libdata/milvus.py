@@ -92,20 +92,21 @@ class LazyMilvusClient(LazyClient[MilvusClient]):
         self._conn_pool = connection_pool if connection_pool else self.DEFAULT_CONN_POOL
 
     def _connect(self):
-        client = self._conn_pool.get(self._conn_url)
-        if client is None:
-            client = MilvusClient(
-                self._conn_url,
-                user=self.username,
-                password=self.password,
-                db_name=self.database
-            )
-        return client
+        return self._conn_pool.acquire(self._conn_url, self._create_client)
+
+    def _create_client(self):
+        return MilvusClient(
+            self._conn_url,
+            user=self.username,
+            password=self.password,
+            db_name=self.database
+        )
 
     def _disconnect(self, client):
-        client = self._conn_pool.put(self._conn_url, client)
-        if client is not None:
-            client.close()
+        self._conn_pool.release(self._conn_url, client)
+
+    def _get_pool(self):
+        return self._conn_pool, self._conn_url
 
     def exists(self, timeout: Optional[float] = None) -> bool:
         return self.client.has_collection(self.collection, timeout=timeout)
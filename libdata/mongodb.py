@@ -8,10 +8,18 @@ __all__ = [
 ]
 
 import sys
-from typing import Any, Generator, List, Mapping, Optional, Tuple, Union
-
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from queue import Queue
+from threading import Lock, Thread
+from typing import Any, Dict, Generator, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+from bson import CodecOptions, ObjectId
+from bson.raw_bson import RawBSONDocument
 from pydantic import BaseModel
-from pymongo import MongoClient
+from pymongo import InsertOne, MongoClient, ReplaceOne, UpdateOne
 from pymongo.client_session import ClientSession
 from pymongo.collection import Collection
 from pymongo.cursor import Cursor
@@ -19,13 +27,22 @@ from pymongo.database import Database
 from pymongo.results import DeleteResult, UpdateResult
 from tqdm import tqdm
 
-from libdata.common import ConnectionPool, DocIterator, DocReader, DocWriter, LazyClient
+from libdata.cache import MISSING, Cache, create_cache, pop_cache_params
+from libdata.common import (
+    ConnectionPool, DocIterator, DocReader, DocWriter, LazyClient, merge_range_scans, parse_partition_params,
+    ranges_from_bounds, select_ranges
+)
+from libdata.keys import KeyStore
 from libdata.url import URL
 
 
 class LazyMongoClient(LazyClient[MongoClient]):
     """Mongo client with a connection pool.
     The client is thread safe.
+
+    insert() buffers documents per collection. A buffer is written when it has more than buffer_size documents,
+    or when it is flushed. Concurrent flushes of a collection are coalesced: while one thread is writing, documents
+    inserted by other threads are collected, and written together by the next flush.
     """
 
     @classmethod
@@ -43,6 +60,17 @@ class LazyMongoClient(LazyClient[MongoClient]):
             connection_pool: Optional[ConnectionPool] = None
     ):
         super().__init__()
+        self._init_url(url, auth_source, buffer_size)
+
+        self._conn_pool = connection_pool if connection_pool else self.DEFAULT_CONN_POOL
+        self._db = None
+        self._coll = None
+        self._buffers: Dict[str, List[dict]] = {}
+        self._buffer_lock = Lock()
+        self._flush_locks: Dict[str, Lock] = defaultdict(Lock)
+
+    def _init_url(self, url: Union[str, URL], auth_source: str, buffer_size: int):
+        """Parse the URL and its parameters, which override the given auth_source and buffer_size."""
         url = URL.ensure_url(url)
 
         if url.scheme not in {"mongo", "mongodb"}:
@@ -74,21 +102,15 @@ class LazyMongoClient(LazyClient[MongoClient]):
 
         self.database, self.collection = url.get_database_and_table()
 
-        self._conn_pool = connection_pool if connection_pool else self.DEFAULT_CONN_POOL
-        self._db = None
-        self._coll = None
-        self.buffer = []
-
     def _connect(self):
-        client = self._conn_pool.get(self._conn_url)
-        if client is None:
-            client = MongoClient(self._conn_url)
-        return client
+        # MongoClient monitors and reconnects its servers by itself, so no pre-ping is needed.
+        return self._conn_pool.acquire(self._conn_url, lambda: MongoClient(self._conn_url))
 
     def _disconnect(self, client):
-        client = self._conn_pool.put(self._conn_url, client)
-        if client is not None:
-            client.close()
+        self._conn_pool.release(self._conn_url, client)
+
+    def _get_pool(self):
+        return self._conn_pool, self._conn_url
 
     def get_database(self) -> Database:
         if self._db is None:
@@ -107,18 +129,31 @@ class LazyMongoClient(LazyClient[MongoClient]):
             self._coll = self.get_database().get_collection(self.collection)
         return self._coll
 
-    def insert(self, docs: Union[dict, List[dict]], flush=True):
-        if isinstance(docs, List):
-            self.buffer.extend(docs)
-        else:
-            self.buffer.append(docs)
+    @property
+    def buffer(self) -> List[dict]:
+        """The buffered documents of the default collection."""
+        with self._buffer_lock:
+            return list(self._buffers.get(self.collection, []))
 
-        if len(self.buffer) > self.buffer_size:
-            coll = self.get_collection()
-            coll.insert_many(self.buffer)
-            self.buffer.clear()
-        elif flush:
-            self.flush()
+    def _get_collection_name(self, collection: str | None = None) -> str:
+        if collection:
+            return collection
+        if not self.collection:
+            raise RuntimeError("Collection name should be given.")
+        return self.collection
+
+    def insert(self, docs: Union[dict, List[dict]], flush=True, collection: str | None = None):
+        name = self._get_collection_name(collection)
+        with self._buffer_lock:
+            buffer = self._buffers.setdefault(name, [])
+            if isinstance(docs, List):
+                buffer.extend(docs)
+            else:
+                buffer.append(docs)
+            full = len(buffer) > self.buffer_size
+
+        if full or flush:
+            self._flush_collection(name)
 
     def insert_one(self, doc: dict, collection: str | None = None):
         coll = self.get_collection(collection)
@@ -128,11 +163,32 @@ class LazyMongoClient(LazyClient[MongoClient]):
         coll = self.get_collection(collection)
         return coll.insert_many(docs)
 
-    def flush(self):
-        if len(self.buffer) != 0:
-            coll = self.get_collection()
-            coll.insert_many(self.buffer)
-            self.buffer.clear()
+    def flush(self, collection: str | None = None):
+        """Write the buffered documents of the given collection, or of all collections if collection is None."""
+        if collection:
+            self._flush_collection(collection)
+        else:
+            with self._buffer_lock:
+                names = list(self._buffers)
+            for name in names:
+                self._flush_collection(name)
+
+    def _flush_collection(self, name: str):
+        with self._buffer_lock:
+            flush_lock = self._flush_locks[name]
+        # The flush lock is held while writing, so that the documents inserted meanwhile are written by one flush.
+        # Once a thread gets the lock, its documents have been written by the previous holder, or are in the buffer.
+        with flush_lock:
+            with self._buffer_lock:
+                buffer = self._buffers.pop(name, None)
+            if buffer:
+                try:
+                    self.get_collection(name).insert_many(buffer)
+                except Exception:
+                    # Put the documents back in front of the ones inserted meanwhile, so that the next flush retries.
+                    with self._buffer_lock:
+                        self._buffers[name] = buffer + self._buffers.get(name, [])
+                    raise
 
     def close(self):
         self.flush()
@@ -243,7 +299,27 @@ class LazyMongoClient(LazyClient[MongoClient]):
 
 
 class MongoIterator(DocIterator):
-    """Iterator for MongoDB collections."""
+    """Iterator for MongoDB collections.
+
+    With partitions > 1, the key space (key_field, "_id" by default) is split into ranges, and the ranges are scanned
+    in parallel, each by a thread with its own pooled connection.
+    Documents of the ranges are merged as they arrive, so the order of the documents is not preserved.
+    For distributed workers, rank and world_size select the ranges of this worker, so that the workers together scan
+    the collection exactly once.
+
+    The ranges are split by (split):
+        "sample": the quantiles of a "$sample" of the keys, which balances the ranges for any key type,
+        "minmax": evenly between the min and max keys, for int, float, datetime and ObjectId (by its timestamp) keys.
+    The default is "sample" for a single worker, and "minmax" for distributed workers. "sample" is rejected for
+    distributed workers, since sampling is random and all workers must get the same ranges.
+    Note that the keys should be of the same type, since range queries only match keys of the type of the boundaries.
+
+    URL example:
+        mongo://host/db/coll?partitions=8&rank=0&world_size=4
+    """
+
+    SAMPLES_PER_PARTITION = 32
+    QUEUE_SIZE = 4096
 
     @classmethod
     def from_url(cls, url: Union[str, URL], auth_db: str = "admin"):
@@ -252,29 +328,138 @@ class MongoIterator(DocIterator):
             raise ValueError(f"Unsupported scheme '{url.scheme}'.")
         return cls(url, auth_db=auth_db)
 
-    def __init__(self, url: Union[str, URL], auth_db: str = "admin"):
+    def __init__(
+            self,
+            url: Union[str, URL],
+            auth_db: str = "admin",
+            key_field: str = "_id",
+            partitions: int = 1,
+            rank: int = 0,
+            world_size: int = 1,
+            split: Optional[str] = None
+    ):
         super().__init__()
 
         url = URL.ensure_url(url)
+        if url.parameters:
+            params = url.parameters
+            if "key_field" in params:
+                key_field = params["key_field"]
+            elif "keyField" in params:
+                key_field = params["keyField"]
+
+            if "split" in params:
+                split = params["split"]
+        partitions, rank, world_size = parse_partition_params(url.parameters, partitions, rank, world_size)
+
+        self.url = url
+        self.auth_db = auth_db
+        self.key_field = key_field
+        self.partitions = partitions
+        self.rank = rank
+        self.world_size = world_size
+        self.split = split if split else ("sample" if world_size == 1 else "minmax")
+        if self.split not in {"sample", "minmax"}:
+            raise ValueError(f"Unsupported split \"{self.split}\".")
+        if self.split == "sample" and world_size > 1:
+            raise ValueError("split \"sample\" can't be used with world_size > 1, since the samples differ by worker.")
         self.client = LazyMongoClient(url, auth_source=auth_db)
 
+        self._ranges = None
         self._cursor = None
         self._exhausted = False
         self._count = None
 
+    def split_ranges(self, n: int) -> List[Tuple[Any, Any]]:
+        """Split the key space into (at most) n ranges [lower, upper), where None means unbounded."""
+        if n <= 1:
+            return [(None, None)]
+
+        return ranges_from_bounds(self._sample_bounds(n) if self.split == "sample" else self._minmax_bounds(n))
+
+    def _sample_bounds(self, n: int) -> List[Any]:
+        coll = self.client.get_collection()
+        sample_size = min(coll.estimated_document_count(), n * self.SAMPLES_PER_PARTITION)
+        if sample_size == 0:
+            return []
+        pipeline = [
+            {"$sample": {"size": sample_size}},
+            {"$project": {self.key_field: 1}}
+        ]
+        with coll.aggregate(pipeline) as cur:
+            keys = sorted(doc[self.key_field] for doc in cur if self.key_field in doc)
+        return [keys[len(keys) * i // n] for i in range(1, n)] if keys else []
+
+    def _minmax_bounds(self, n: int) -> List[Any]:
+        projection = {self.key_field: 1}
+        docs = [
+            self.client.find_one({self.key_field: {"$exists": True}}, projection, sort=[(self.key_field, order)])
+            for order in (1, -1)
+        ]
+        if docs[0] is None:
+            return []
+        lower, upper = docs[0][self.key_field], docs[1][self.key_field]
+
+        if isinstance(lower, ObjectId) and isinstance(upper, ObjectId):
+            # ObjectIds begin with their creation time, so the timestamps are split instead.
+            start, end = lower.generation_time, upper.generation_time + timedelta(seconds=1)
+            return [ObjectId.from_datetime(start + (end - start) * i / n) for i in range(1, n)]
+        elif isinstance(lower, datetime) and isinstance(upper, datetime):
+            return [lower + (upper - lower) * i / n for i in range(1, n)]
+        elif isinstance(lower, int) and isinstance(upper, int):
+            return [lower + (upper - lower + 1) * i // n for i in range(1, n)]
+        elif isinstance(lower, (int, float)) and isinstance(upper, (int, float)):
+            return [lower + (upper - lower) * i / n for i in range(1, n)]
+        raise ValueError(
+            f"Keys of type \"{type(lower).__name__}\" can't be split by \"minmax\", "
+            f"split by \"sample\" with a single worker instead."
+        )
+
+    def get_ranges(self) -> List[Tuple[Any, Any]]:
+        """The key ranges scanned by this worker."""
+        if self._ranges is None:
+            self._ranges = select_ranges(self.split_ranges, self.partitions, self.rank, self.world_size)
+        return self._ranges
+
+    def _range_query(self, lower, upper) -> Mapping[str, Any]:
+        cond = {}
+        if lower is not None:
+            cond["$gte"] = lower
+        if upper is not None:
+            cond["$lt"] = upper
+        return {self.key_field: cond} if cond else {}
+
     def __len__(self):
         if self._count is None:
-            self._count = self.client.count_documents()
+            ranges = self.get_ranges()
+            if ranges == [(None, None)]:
+                self._count = self.client.count_documents()
+            else:
+                self._count = sum(self.client.count_documents(self._range_query(*r)) for r in ranges)
         return self._count
 
     def __iter__(self):
         if self._cursor is None:
-            self._cursor = self.client.find(
-                projection={f: 1 for f in self.fields} if self.fields else None
-            )
+            projection = {f: 1 for f in self.fields} if self.fields else None
+            ranges = self.get_ranges()
+            if len(ranges) == 1:
+                self._cursor = self.client.find(self._range_query(*ranges[0]), projection=projection)
+            else:
+                # No range (e.g., an empty collection for an extra worker) gives an empty iterator.
+                self._cursor = merge_range_scans(
+                    ranges,
+                    lambda lower, upper: self._scan_range(lower, upper, projection),
+                    self.QUEUE_SIZE
+                )
             self._exhausted = False
         return self
 
+    def _scan_range(self, lower, upper, projection):
+        # Each range is scanned with its own client, so that it gets its own connection from the pool.
+        with LazyMongoClient(self.url, auth_source=self.auth_db) as client:
+            with client.find(self._range_query(lower, upper), projection=projection) as cur:
+                yield from cur
+
     def __next__(self):
         if self._exhausted:
             raise StopIteration()
@@ -309,6 +494,22 @@ class MongoIterator(DocIterator):
 
 
 class MongoReader(DocReader):
+    """Reader for MongoDB collections.
+    Documents are indexed by the keys fetched when the reader is created.
+    Slices, lists of indices and iteration are served by batched "$in" queries, with the next batch of the iteration
+    prefetched in background.
+    With use_cache, documents are kept in a bounded cache (see libdata.cache), which is configured by the cache
+    parameters of the URL (cache_policy, cache_size, cache_bytes, cache_ttl), or given directly by cache.
+    The keys are held in a compact KeyStore. With key_cache (a file path), the keys are saved to disk and reused by
+    later readers, as long as the estimated document count of the collection doesn't change.
+
+    Only the given fields are fetched, which are a list of field names (URL: "?fields=a,b,c"), or a Pydantic model
+    (whose projection is created by LazyMongoClient.create_projection(), and documents are returned as models).
+    With raw_bson, documents are returned as RawBSONDocument, which decodes a field only when it is accessed.
+    """
+
+    DEFAULT_BATCH_SIZE = 256
+    KEY_FETCH_BATCH_SIZE = 100000
 
     @classmethod
     def from_url(cls, url: Union[str, URL]) -> "MongoReader":
@@ -319,10 +520,16 @@ class MongoReader(DocReader):
             url: Union[str, URL],
             auth_db: str = "admin",
             key_field: str = "_id",
-            use_cache: bool = False
+            use_cache: bool = False,
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            cache: Optional[Cache] = None,
+            key_cache: Optional[str] = None,
+            fields: Union[Sequence[str], type[BaseModel], None] = None,
+            raw_bson: bool = False
     ) -> None:
         url = URL.ensure_url(url)
         self.client = LazyMongoClient(url, auth_source=auth_db)
+        cache_kwargs = {}
         if url.parameters:
             params = url.parameters
             if "key_field" in params:
@@ -335,43 +542,174 @@ class MongoReader(DocReader):
             elif "useCache" in params:
                 use_cache = params["useCache"].lower() in {"true", "1"}
 
+            if "batch_size" in params:
+                batch_size = int(params["batch_size"])
+            elif "batchSize" in params:
+                batch_size = int(params["batchSize"])
+
+            cache_kwargs = pop_cache_params(dict(params))
+
+            if "key_cache" in params:
+                key_cache = params["key_cache"]
+            elif "keyCache" in params:
+                key_cache = params["keyCache"]
+
+            if "fields" in params:
+                fields = [field.strip() for field in params["fields"].split(",") if field.strip()]
+
+            if "raw_bson" in params:
+                raw_bson = params["raw_bson"].lower() in {"true", "1"}
+            elif "rawBson" in params:
+                raw_bson = params["rawBson"].lower() in {"true", "1"}
+
         self.key_field = key_field
-        self.use_cache = use_cache
+        self.key_cache = key_cache
+        self.model = None
+        self.projection = None
+        if isinstance(fields, type) and issubclass(fields, BaseModel):
+            if raw_bson:
+                raise ValueError("raw_bson can't be used with a Pydantic model.")
+            self.model = fields
+            self.projection = LazyMongoClient.create_projection(fields)
+        elif fields:
+            self.projection = {field: 1 for field in fields}
+        if self.projection is not None:
+            # The key is always fetched, so that batched results can be matched to their keys.
+            self.projection.setdefault(self.key_field, 1)
+            if self.key_field != "_id":
+                self.projection.setdefault("_id", 0)
+        self.raw_bson = raw_bson
+        self.use_cache = use_cache or cache is not None
+        self.batch_size = batch_size
 
         self.id_list = self._fetch_ids()
-        self.cache = {}
+        self.cache = None
+        if self.use_cache:
+            self.cache = cache if cache is not None else create_cache(**cache_kwargs)
 
-    def _fetch_ids(self):
-        id_list = []
+    def _fetch_ids(self) -> KeyStore:
         with self.client:
-            cur = self.client.find({}, {self.key_field: 1})
-            for doc in tqdm(cur, leave=False):
-                id_list.append(doc[self.key_field])
+            meta = None
+            if self.key_cache:
+                meta = {
+                    "database": self.client.database,
+                    "collection": self.client.collection,
+                    "key_field": self.key_field,
+                    "count": self.client.get_collection().estimated_document_count()
+                }
+                if (id_list := KeyStore.load(self.key_cache, **meta)) is not None:
+                    return id_list
+
+            projection = {self.key_field: 1}
+            if self.key_field != "_id":
+                projection["_id"] = 0
+            with self.client.find({}, projection).batch_size(self.KEY_FETCH_BATCH_SIZE) as cur:
+                id_list = KeyStore.from_iterable(doc[self.key_field] for doc in tqdm(cur, leave=False))
+
+            if meta is not None:
+                id_list.save(self.key_cache, **meta)
         return id_list
 
     def __len__(self):
         return len(self.id_list)
 
-    def __getitem__(self, idx: int):
+    def __getitem__(self, idx: Union[int, slice, Sequence[int]]):
+        if isinstance(idx, slice):
+            return self.get_many(range(len(self))[idx])
+        elif not isinstance(idx, int) and isinstance(idx, Iterable):
+            return self.get_many(idx)
+
         _id = self.id_list[idx]
-        if self.use_cache and _id in self.cache:
-            return self.cache[_id]
+        if self.use_cache and (doc := self.cache.get(_id, MISSING)) is not MISSING:
+            return doc
 
-        doc = self.client.find_one({self.key_field: _id})
+        doc = self._find_one({self.key_field: _id})
 
         if self.use_cache:
-            self.cache[_id] = doc
+            self.cache.put(_id, doc)
         return doc
 
+    def _find(self, query: Mapping[str, Any]) -> Cursor:
+        coll = self.client.get_collection()
+        if self.raw_bson:
+            coll = coll.with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
+        # Aggregation expressions (e.g., {"field": "$original"}) are supported by the projection of find().
+        return coll.find(query, projection=self.projection)
+
+    def _find_one(self, query: Mapping[str, Any]):
+        with self._find(query).limit(1) as cur:
+            for doc in cur:
+                return self._to_output(doc)
+        return None
+
+    def _to_output(self, doc):
+        return self.model.model_validate(doc) if self.model is not None else doc
+
+    def get_many(self, indices: Iterable[int]) -> List[Optional[dict]]:
+        """Get the documents of the given indices, in the same order.
+        The keys are queried in batches of batch_size with "$in". None is returned for a missing document.
+        """
+        id_list = [self.id_list[idx] for idx in indices]
+
+        docs = {}
+        missing = []
+        for _id in id_list:
+            if _id in docs:
+                continue
+            if self.use_cache and (doc := self.cache.get(_id, MISSING)) is not MISSING:
+                docs[_id] = doc
+            else:
+                docs[_id] = None
+                missing.append(_id)
+
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            with self._find({self.key_field: {"$in": batch}}) as cur:
+                for doc in cur:
+                    docs[doc[self.key_field]] = self._to_output(doc)
+
+        if self.use_cache:
+            for _id in missing:
+                self.cache.put(_id, docs[_id])
+        return [docs[_id] for _id in id_list]
+
+    def __iter__(self):
+        size = len(self)
+        if size == 0:
+            return
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(self.get_many, range(0, min(self.batch_size, size)))
+            for start in range(0, size, self.batch_size):
+                docs = future.result()
+                next_start = start + self.batch_size
+                if next_start < size:
+                    future = executor.submit(self.get_many, range(next_start, min(next_start + self.batch_size, size)))
+                yield from docs
+
     def read(self, _key=None, **kwargs):
         query = kwargs
         if _key is not None:
             query[self.key_field] = _key
 
-        return self.client.find_one(query)
+        return self._find_one(query)
 
 
 class MongoWriter(DocWriter):
+    """Writer for MongoDB collections.
+
+    Documents are buffered, and each full buffer (buffer_size documents) is written by an unordered bulk_write().
+    The operation of each document is given by mode:
+        "insert": insert the document,
+        "upsert": update the fields of the document with the same key_field value, or insert it,
+        "replace": replace the document with the same key_field value, or insert it.
+    With background, full buffers are handed to a background thread, so that the producer keeps filling the next
+    buffer while the previous one is written. At most queue_size buffers wait for writing, after which write() blocks.
+    Once a batch fails in background, the writer stops: the batches still queued are dropped and counted, and every
+    later write(), flush() or close() raises the error with the number of dropped documents.
+    stats() reports the number of batches and documents, the latency of the batches and the throughput.
+    """
+
+    MODES = {"insert", "upsert", "replace"}
 
     @classmethod
     def from_url(cls, url: Union[str, URL]):
@@ -381,25 +719,157 @@ class MongoWriter(DocWriter):
             self,
             url: Union[str, URL],
             auth_db: str = "admin",
-            buffer_size: int = 512
+            buffer_size: int = 512,
+            mode: str = "insert",
+            key_field: str = "_id",
+            ordered: bool = False,
+            background: bool = False,
+            queue_size: int = 2
     ):
+        url = URL.ensure_url(url)
+        if url.parameters:
+            params = url.parameters
+            if "mode" in params:
+                mode = params["mode"]
+            if "key_field" in params:
+                key_field = params["key_field"]
+            elif "keyField" in params:
+                key_field = params["keyField"]
+            if "ordered" in params:
+                ordered = params["ordered"].lower() in {"true", "1"}
+            if "background" in params:
+                background = params["background"].lower() in {"true", "1"}
+            if "queue_size" in params:
+                queue_size = int(params["queue_size"])
+            elif "queueSize" in params:
+                queue_size = int(params["queueSize"])
+
+        if mode not in self.MODES:
+            raise ValueError(f"Unsupported mode \"{mode}\".")
+
         self.client = LazyMongoClient(
             url,
             auth_source=auth_db,
             buffer_size=buffer_size
         )
+        self.mode = mode
+        self.key_field = key_field
+        self.ordered = ordered
+        self.background = background
+        self.queue_size = queue_size
+
+        self._buffer = []
+        self._queue = None
+        self._thread = None
+        self._error = None
+        self._num_dropped = 0
+
+        self._stats_lock = Lock()
+        self._num_batches = 0
+        self._num_docs = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+        self._last_latency = 0.0
 
     def write(self, doc):
-        return self.client.insert(doc, flush=False)
+        self._check_error()
+        if self.mode != "insert" and self.key_field not in doc:
+            raise ValueError(f"The input document doesn't contain the key field (\"{self.key_field}\").")
+        self._buffer.append(doc)
+        if len(self._buffer) >= self.client.buffer_size:
+            self._submit()
+
+    def _submit(self):
+        self._check_error()
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        if self.background:
+            if self._thread is None:
+                self._queue = Queue(self.queue_size)
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._queue.put(batch)
+        else:
+            self._write_batch(batch)
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            try:
+                if batch is None:
+                    return
+                if self._error is None:
+                    self._write_batch(batch)
+                else:
+                    self._num_dropped += len(batch)
+            except Exception as e:
+                self._num_dropped += len(batch)
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _check_error(self):
+        # The error is kept, so that no more batches are accepted after a failure.
+        if self._error is not None:
+            raise RuntimeError(
+                f"Failed to write to MongoDB: {self._error}. "
+                f"{self._num_dropped} documents are in the failed batch and the dropped batches."
+            ) from self._error
+
+    def _make_operation(self, doc):
+        if self.mode == "insert":
+            return InsertOne(doc)
+        query = {self.key_field: doc[self.key_field]}
+        if self.mode == "upsert":
+            return UpdateOne(query, {"$set": doc}, upsert=True)
+        return ReplaceOne(query, doc, upsert=True)
+
+    def _write_batch(self, batch: List[dict]):
+        start_time = time.perf_counter()
+        coll = self.client.get_collection()
+        coll.bulk_write([self._make_operation(doc) for doc in batch], ordered=self.ordered)
+        latency = time.perf_counter() - start_time
+
+        with self._stats_lock:
+            self._num_batches += 1
+            self._num_docs += len(batch)
+            self._total_latency += latency
+            self._max_latency = max(self._max_latency, latency)
+            self._last_latency = latency
+
+    def stats(self) -> Mapping[str, float]:
+        with self._stats_lock:
+            return {
+                "batches": self._num_batches,
+                "docs": self._num_docs,
+                "last_latency": self._last_latency,
+                "mean_latency": self._total_latency / self._num_batches if self._num_batches else 0.0,
+                "max_latency": self._max_latency,
+                "docs_per_second": self._num_docs / self._total_latency if self._total_latency > 0 else 0.0,
+            }
 
     def flush(self):
-        return self.client.flush()
+        self._submit()
+        if self._queue is not None:
+            self._queue.join()
+        self._check_error()
 
     def close(self):
-        return self.client.close()
+        if getattr(self, "client", None) is None:
+            return
+        try:
+            self.flush()
+        finally:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+            self.client.close()
+            self.client = None
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        return self.client.__exit__(exc_type, exc_val, exc_tb)
+        self.close()
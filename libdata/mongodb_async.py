@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+
+__author__ = "xi"
+__all__ = [
+    "AsyncLazyMongoClient",
+    "AsyncMongoReader",
+    "AsyncMongoWriter",
+]
+
+import asyncio
+import sys
+from typing import Any, AsyncIterator, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+from weakref import WeakKeyDictionary
+
+from pydantic import BaseModel
+from pymongo.results import DeleteResult, UpdateResult
+
+from libdata.cache import MISSING, Cache, create_cache, pop_cache_params
+from libdata.common import ConnectionPool
+from libdata.keys import KeyStoreBuilder
+from libdata.mongodb import LazyMongoClient
+from libdata.url import URL
+
+try:
+    from pymongo import AsyncMongoClient
+    from pymongo.asynchronous.collection import AsyncCollection
+    from pymongo.asynchronous.database import AsyncDatabase
+except ImportError:
+    AsyncMongoClient = None
+    AsyncCollection = None
+    AsyncDatabase = None
+
+# The pool of each event loop: {loop: (pool, shutdown_hook)}.
+# Keyed by the loop objects rather than their ids, since ids are reused once loops are collected.
+# The hook refers to its loop, so the entries are removed explicitly: by the hook itself, or once the loop is closed.
+_LOOP_POOLS: "WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[ConnectionPool, Any]]" = WeakKeyDictionary()
+
+# The tasks closing clients, which are only weakly referenced by their loops.
+_CLOSING_TASKS = set()
+
+
+async def _close_on_shutdown(pool: ConnectionPool):
+    """Close the pooled clients when the event loop shuts down.
+    This is an async generator, since the loop finalizes its async generators in loop.shutdown_asyncgens() (called by
+    asyncio.run()), when the clients can still be closed on the loop.
+    """
+    try:
+        yield
+    finally:
+        _LOOP_POOLS.pop(asyncio.get_running_loop(), None)
+        for key in pool.stats():
+            while (client := pool.get(key)) is not None:
+                try:
+                    await client.close()
+                except Exception as e:
+                    print(f"Failed to close client: {e}", file=sys.stderr)
+
+
+def _close_client(client: AsyncMongoClient):
+    """The close hook of the pooled clients.
+    The pool closes connections synchronously, so the client is closed by a task of the running loop.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Outside the loop of the client, which can't be closed by another loop.
+        return
+    task = loop.create_task(client.close())
+    _CLOSING_TASKS.add(task)
+    task.add_done_callback(_CLOSING_TASKS.discard)
+
+
+def _get_loop_pool(max_size: int) -> ConnectionPool:
+    loop = asyncio.get_running_loop()
+    if (entry := _LOOP_POOLS.get(loop)) is None:
+        # Loops closed without shutdown_asyncgens(), whose clients can't be closed anymore.
+        for closed_loop in [other for other in _LOOP_POOLS.keys() if other.is_closed()]:
+            del _LOOP_POOLS[closed_loop]
+
+        pool = ConnectionPool(max_size)
+        hook = _close_on_shutdown(pool)
+        # The hook is registered to the loop when it is first iterated, and is held here since the loop only keeps
+        # weak references of its async generators.
+        loop.create_task(anext(hook))
+        entry = _LOOP_POOLS[loop] = (pool, hook)
+    return entry[0]
+
+
+class AsyncLazyMongoClient:
+    """Asyncio counterpart of LazyMongoClient, based on the async API of PyMongo (4.9+).
+
+    An AsyncMongoClient is bound to the event loop it is used in, so clients are pooled per event loop, and the pooled
+    clients are closed when their loop shuts down. A given connection_pool is shared by all loops, so it should only be
+    used with a single event loop. Its max_connections cap is waited for synchronously, which blocks the event loop,
+    so it should come with a timeout.
+    Each AsyncMongoClient keeps its own pool of connections, so that many queries of one process can be in flight
+    at the same time.
+    The client should be closed (await close(), or "async with") to return its AsyncMongoClient to the pool.
+    """
+
+    @classmethod
+    def from_url(cls, url: Union[str, URL]):
+        return cls(url)
+
+    DEFAULT_CONN_POOL_SIZE = 16
+
+    _init_url = LazyMongoClient._init_url
+
+    def __init__(
+            self,
+            url: Union[str, URL],
+            auth_source: str = "admin",
+            buffer_size: int = 1000,
+            connection_pool: Optional[ConnectionPool] = None
+    ):
+        if AsyncMongoClient is None:
+            raise RuntimeError("\"pymongo>=4.9\" should be installed to use the async client.")
+        self._init_url(url, auth_source, buffer_size)
+
+        self._conn_pool = connection_pool
+        self._client = None
+        self._client_pool = None
+        self._db = None
+        self._coll = None
+        self._buffers: Dict[str, List[dict]] = {}
+
+    @property
+    def client(self) -> AsyncMongoClient:
+        if self._client is None:
+            pool = self._conn_pool
+            if pool is None:
+                pool = _get_loop_pool(self.DEFAULT_CONN_POOL_SIZE)
+            # AsyncMongoClient monitors and reconnects its servers by itself, so no pre-ping is needed.
+            self._client = pool.acquire(self._conn_url, lambda: AsyncMongoClient(self._conn_url), close=_close_client)
+            self._client_pool = pool
+        return self._client
+
+    async def close(self):
+        await self.flush()
+        self._db = None
+        self._coll = None
+        if self._client is not None:
+            self._client_pool.release(self._conn_url, self._client)
+            self._client = None
+            self._client_pool = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def get_database(self) -> AsyncDatabase:
+        if self._db is None:
+            if not self.database:
+                raise RuntimeError("Database name should be given.")
+            self._db = self.client.get_database(self.database)
+        return self._db
+
+    def get_collection(self, collection: str | None = None) -> AsyncCollection:
+        if collection:
+            return self.get_database().get_collection(collection)
+
+        if self._coll is None:
+            if not self.collection:
+                raise RuntimeError("Collection name should be given.")
+            self._coll = self.get_database().get_collection(self.collection)
+        return self._coll
+
+    @property
+    def buffer(self) -> List[dict]:
+        """The buffered documents of the default collection."""
+        return list(self._buffers.get(self.collection, []))
+
+    async def insert(self, docs: Union[dict, List[dict]], flush=True, collection: str | None = None):
+        name = collection or self.collection
+        if not name:
+            raise RuntimeError("Collection name should be given.")
+        buffer = self._buffers.setdefault(name, [])
+        if isinstance(docs, List):
+            buffer.extend(docs)
+        else:
+            buffer.append(docs)
+
+        if len(buffer) > self.buffer_size or flush:
+            await self.flush(name)
+
+    async def insert_one(self, doc: dict, collection: str | None = None):
+        return await self.get_collection(collection).insert_one(doc)
+
+    async def insert_many(self, docs: List[dict], collection: str | None = None):
+        return await self.get_collection(collection).insert_many(docs)
+
+    async def flush(self, collection: str | None = None):
+        """Write the buffered documents of the given collection, or of all collections if collection is None."""
+        for name in ([collection] if collection else list(self._buffers)):
+            # The buffer is taken before awaiting, so that the documents inserted meanwhile go to the next flush.
+            if buffer := self._buffers.pop(name, None):
+                await self.get_collection(name).insert_many(buffer)
+
+    async def count_documents(self, query: Optional[Mapping[str, Any]] = None, collection: str | None = None) -> int:
+        return await self.get_collection(collection).count_documents(query if query is not None else {})
+
+    async def distinct(self, key, query: Optional[Mapping[str, Any]] = None, collection: str | None = None):
+        return await self.get_collection(collection).distinct(key, query)
+
+    def find(
+            self,
+            query: Optional[Mapping[str, Any]] = None,
+            projection: Optional[Mapping[str, Any] | type[BaseModel]] = None,
+            skip: Optional[int] = 0,
+            limit: Optional[int] = 0,
+            sort: Optional[List[Tuple[str, int]]] = None,
+            collection: str | None = None
+    ) -> AsyncIterator[dict | BaseModel]:
+        """Find documents. The result should be consumed by "async for"."""
+        coll = self.get_collection(collection)
+        if isinstance(projection, type) and issubclass(projection, BaseModel):
+            pipeline = []
+            if query:
+                pipeline.append({"$match": query})
+            pipeline.append({"$project": self.create_projection(projection)})
+            if sort:
+                pipeline.append({"$sort": dict(sort)})
+            if skip:
+                pipeline.append({"$skip": skip})
+            if limit:
+                pipeline.append({"$limit": limit})
+
+            async def _iter_objs():
+                async with await coll.aggregate(pipeline) as cur:
+                    async for doc in cur:
+                        yield projection.model_validate(doc)
+
+            return _iter_objs()
+        else:
+            return coll.find(
+                filter=query,
+                projection=projection,
+                skip=skip,
+                limit=limit,
+                sort=sort
+            )
+
+    async def find_one(
+            self,
+            query: Optional[Mapping[str, Any]] = None,
+            projection: Optional[Mapping[str, Any] | type[BaseModel]] = None,
+            sort: Optional[List[Tuple[str, int]]] = None,
+            collection: str | None = None
+    ) -> dict | BaseModel | None:
+        async for result in self.find(query, projection, limit=1, sort=sort, collection=collection):
+            return result
+        return None
+
+    create_projection = staticmethod(LazyMongoClient.create_projection)
+
+    async def delete_one(self, query: Mapping[str, Any], collection: str | None = None) -> DeleteResult:
+        return await self.get_collection(collection).delete_one(query)
+
+    async def delete_many(self, query: Mapping[str, Any], collection: str | None = None) -> DeleteResult:
+        return await self.get_collection(collection).delete_many(query)
+
+    async def update_one(
+            self,
+            query: Mapping[str, Any],
+            update: Mapping[str, Any],
+            upsert: bool = False,
+            collection: str | None = None
+    ) -> UpdateResult:
+        return await self.get_collection(collection).update_one(
+            filter=query,
+            update=update,
+            upsert=upsert
+        )
+
+    async def update_many(
+            self,
+            query: Mapping[str, Any],
+            update: Mapping[str, Any],
+            upsert: bool = False,
+            collection: str | None = None
+    ) -> UpdateResult:
+        return await self.get_collection(collection).update_many(
+            filter=query,
+            update=update,
+            upsert=upsert
+        )
+
+
+class AsyncMongoReader:
+    """Asyncio counterpart of MongoReader.
+    The keys are fetched by open(), which is called on entering "async with".
+    Documents are read by "await reader.get(idx)", "await reader.get_many(indices)", "await reader.read(key)",
+    or "async for doc in reader".
+    """
+
+    DEFAULT_BATCH_SIZE = 256
+    KEY_FETCH_BATCH_SIZE = 100000
+
+    @classmethod
+    def from_url(cls, url: Union[str, URL]) -> "AsyncMongoReader":
+        return AsyncMongoReader(url)
+
+    def __init__(
+            self,
+            url: Union[str, URL],
+            auth_db: str = "admin",
+            key_field: str = "_id",
+            use_cache: bool = False,
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            cache: Optional[Cache] = None
+    ) -> None:
+        url = URL.ensure_url(url)
+        self.client = AsyncLazyMongoClient(url, auth_source=auth_db)
+        cache_kwargs = {}
+        if url.parameters:
+            params = url.parameters
+            if "key_field" in params:
+                key_field = params["key_field"]
+            elif "keyField" in params:
+                key_field = params["keyField"]
+
+            if "use_cache" in params:
+                use_cache = params["use_cache"].lower() in {"true", "1"}
+            elif "useCache" in params:
+                use_cache = params["useCache"].lower() in {"true", "1"}
+
+            if "batch_size" in params:
+                batch_size = int(params["batch_size"])
+            elif "batchSize" in params:
+                batch_size = int(params["batchSize"])
+
+            cache_kwargs = pop_cache_params(dict(params))
+
+        self.key_field = key_field
+        self.use_cache = use_cache or cache is not None
+        self.batch_size = batch_size
+
+        self.id_list = None
+        self.cache = None
+        if self.use_cache:
+            self.cache = cache if cache is not None else create_cache(**cache_kwargs)
+
+    async def open(self) -> "AsyncMongoReader":
+        if self.id_list is None:
+            projection = {self.key_field: 1}
+            if self.key_field != "_id":
+                projection["_id"] = 0
+            builder = KeyStoreBuilder()
+            async with self.client.find({}, projection).batch_size(self.KEY_FETCH_BATCH_SIZE) as cur:
+                async for doc in cur:
+                    builder.append(doc[self.key_field])
+            self.id_list = builder.build()
+        return self
+
+    async def close(self):
+        await self.client.close()
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def __len__(self):
+        if self.id_list is None:
+            raise RuntimeError("The reader should be opened first.")
+        return len(self.id_list)
+
+    async def get(self, idx: int):
+        _id = self.id_list[idx]
+        if self.use_cache and (doc := self.cache.get(_id, MISSING)) is not MISSING:
+            return doc
+
+        doc = await self.client.find_one({self.key_field: _id})
+
+        if self.use_cache:
+            self.cache.put(_id, doc)
+        return doc
+
+    async def get_many(self, indices: Iterable[int]) -> List[Optional[dict]]:
+        """Get the documents of the given indices, in the same order.
+        The keys are queried in batches of batch_size with "$in", and the batches are queried concurrently.
+        None is returned for a missing document.
+        """
+        id_list = [self.id_list[idx] for idx in indices]
+
+        docs = {}
+        missing = []
+        for _id in id_list:
+            if _id in docs:
+                continue
+            if self.use_cache and (doc := self.cache.get(_id, MISSING)) is not MISSING:
+                docs[_id] = doc
+            else:
+                docs[_id] = None
+                missing.append(_id)
+
+        async def _fetch(batch):
+            async for doc in self.client.find({self.key_field: {"$in": batch}}):
+                docs[doc[self.key_field]] = doc
+
+        await asyncio.gather(*(
+            _fetch(missing[start:start + self.batch_size])
+            for start in range(0, len(missing), self.batch_size)
+        ))
+
+        if self.use_cache:
+            for _id in missing:
+                self.cache.put(_id, docs[_id])
+        return [docs[_id] for _id in id_list]
+
+    async def read(self, _key=None, **kwargs):
+        query = kwargs
+        if _key is not None:
+            query[self.key_field] = _key
+
+        return await self.client.find_one(query)
+
+    async def __aiter__(self):
+        size = len(self)
+        if size == 0:
+            return
+        task = asyncio.ensure_future(self.get_many(range(0, min(self.batch_size, size))))
+        try:
+            for start in range(0, size, self.batch_size):
+                docs = await task
+                next_start = start + self.batch_size
+                if next_start < size:
+                    task = asyncio.ensure_future(
+                        self.get_many(range(next_start, min(next_start + self.batch_size, size)))
+                    )
+                for doc in docs:
+                    yield doc
+        finally:
+            task.cancel()
+
+
+class AsyncMongoWriter:
+    """Asyncio counterpart of MongoWriter."""
+
+    @classmethod
+    def from_url(cls, url: Union[str, URL]):
+        return AsyncMongoWriter(url)
+
+    def __init__(
+            self,
+            url: Union[str, URL],
+            auth_db: str = "admin",
+            buffer_size: int = 512
+    ):
+        self.client = AsyncLazyMongoClient(
+            url,
+            auth_source=auth_db,
+            buffer_size=buffer_size
+        )
+
+    async def write(self, doc):
+        return await self.client.insert(doc, flush=False)
+
+    async def flush(self):
+        return await self.client.flush()
+
+    async def close(self):
+        return await self.client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
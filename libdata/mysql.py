@@ -7,21 +7,45 @@ __all__ = [
     "MySQLWriter",
 ]
 
+import math
+import os
 import sys
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Any, Dict, List, Mapping, Optional, Union
+from threading import Lock
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+from weakref import WeakKeyDictionary
 
 from mysql.connector import MySQLConnection
 from mysql.connector.cursor import MySQLCursor
 from tqdm import tqdm
 
-from libdata.common import ConnectionPool, DocIterator, DocReader, DocWriter, LazyClient
+from libdata.cache import MISSING, Cache, create_cache, pop_cache_params
+from libdata.common import (
+    ConnectionPool, DocIterator, DocReader, DocWriter, LazyClient, merge_range_scans, parse_partition_params,
+    ranges_from_bounds, select_ranges
+)
+from libdata.keys import KeyStore
 from libdata.url import Address, URL
 
 
+DEFAULT_BLOCK_SIZE = 1000
+DEFAULT_STMT_CACHE_SIZE = 64
+
+# Prepared statements of each connection: {connection: OrderedDict{(sql, dictionary): (sql, cursor)}}.
+# They live with the connections, so that pooled connections keep their statements across clients.
+_STATEMENTS: "WeakKeyDictionary[MySQLConnection, OrderedDict]" = WeakKeyDictionary()
+_STATEMENTS_LOCK = Lock()
+
+
 class LazyMySQLClient(LazyClient[MySQLConnection]):
     """MySQL client with a connection pool.
     The client is thread safe.
+    Statements run by execute_prepared() are prepared on the server once per connection, and kept in an LRU cache of
+    stmt_cache_size statements.
     """
 
     @classmethod
@@ -37,7 +61,9 @@ class LazyMySQLClient(LazyClient[MySQLConnection]):
             charset: str | None = None,
             autocommit: bool | None = None,
             connect_timeout: int | None = None,
-            connection_pool: Optional[ConnectionPool] = None
+            connection_pool: Optional[ConnectionPool] = None,
+            stmt_cache_size: int | None = None,
+            allow_local_infile: bool | None = None
     ):
         super().__init__()
         url = URL.ensure_url(url)
@@ -69,6 +95,13 @@ class LazyMySQLClient(LazyClient[MySQLConnection]):
         if connect_timeout is not None:
             valid_params["connect_timeout"] = connect_timeout
 
+        allow_local_infile = (
+            str(allow_local_infile).lower() if allow_local_infile is not None else
+            input_params.get("allow_local_infile")
+        )
+        if allow_local_infile is not None:
+            valid_params["allow_local_infile"] = allow_local_infile
+
         self._conn_url = URL(
             scheme="mysql",
             username=url.username,
@@ -77,19 +110,17 @@ class LazyMySQLClient(LazyClient[MySQLConnection]):
             parameters=valid_params
         ).to_string()
 
+        self.stmt_cache_size = (
+            stmt_cache_size if stmt_cache_size is not None else
+            int(input_params.get("stmt_cache_size", input_params.get("stmtCacheSize", DEFAULT_STMT_CACHE_SIZE)))
+        )
+
         self.database, self.table = url.get_database_and_table()
 
         self._conn_pool = connection_pool if connection_pool else self.DEFAULT_CONN_POOL
 
     def _connect(self):
-        client = self._conn_pool.get(self._conn_url)
-        if client is None:
-            return self._create_connection()
-        elif not client.is_connected():
-            client.close()
-            return self._create_connection()
-        else:
-            return client
+        return self._conn_pool.acquire(self._conn_url, self._create_connection, ping=MySQLConnection.is_connected)
 
     def _create_connection(self):
         conn_url = URL.ensure_url(self._conn_url)
@@ -100,6 +131,8 @@ class LazyMySQLClient(LazyClient[MySQLConnection]):
             kwargs["autocommit"] = kwargs["autocommit"].lower() in {"true", "1"}
         if "connect_timeout" in kwargs:
             kwargs["connect_timeout"] = float(kwargs["connect_timeout"])
+        if "allow_local_infile" in kwargs:
+            kwargs["allow_local_infile"] = kwargs["allow_local_infile"].lower() in {"true", "1"}
 
         return MySQLConnection(
             host=conn_url.address.host,
@@ -111,9 +144,10 @@ class LazyMySQLClient(LazyClient[MySQLConnection]):
         )
 
     def _disconnect(self, client):
-        client = self._conn_pool.put(self._conn_url, client)
-        if client is not None:
-            client.close()
+        self._conn_pool.release(self._conn_url, client)
+
+    def _get_pool(self):
+        return self._conn_pool, self._conn_url
 
     def cursor(
             self,
@@ -147,6 +181,39 @@ class LazyMySQLClient(LazyClient[MySQLConnection]):
         cur.execute(sql, params=params)
         return cur
 
+    def execute_prepared(
+            self,
+            sql: str,
+            params: Sequence = (),
+            dictionary: Optional[bool] = None
+    ) -> MySQLCursor:
+        """Execute a statement with bound parameters (%s) as a server-side prepared statement.
+        The statement is prepared once per connection and then reused, keyed by the SQL template.
+        The returned cursor belongs to the cache: fetch all its rows, but don't close it.
+        """
+        conn = self.client
+        with _STATEMENTS_LOCK:
+            statements = _STATEMENTS.get(conn)
+            if statements is None:
+                statements = _STATEMENTS[conn] = OrderedDict()
+
+        key = (sql, bool(dictionary))
+        if (entry := statements.get(key)) is not None:
+            statements.move_to_end(key)
+        else:
+            entry = statements[key] = (sql, conn.cursor(prepared=True, dictionary=dictionary))
+            while len(statements) > max(self.stmt_cache_size, 1):
+                _, (_, old_cur) = statements.popitem(last=False)
+                try:
+                    old_cur.close()
+                except Exception as e:
+                    print(e, file=sys.stderr)
+
+        # The cursor reuses its statement only when it is given the very same string object it was prepared with.
+        sql, cur = entry
+        cur.execute(sql, params)
+        return cur
+
     def start_transaction(
             self,
             consistent_snapshot: bool = False,
@@ -171,30 +238,60 @@ class LazyMySQLClient(LazyClient[MySQLConnection]):
         if not table:
             raise ValueError("Table should be given.")
 
-        sql = "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = \"%s\";"
-        with self.execute(sql, params=(table,), buffered=True) as cur:
-            return cur.fetchone()[0] == 1
+        sql = "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s;"
+        return self.execute_prepared(sql, (table,)).fetchall()[0][0] == 1
+
+    def stream(
+            self,
+            sql: str,
+            params=None,
+            block_size: int = DEFAULT_BLOCK_SIZE,
+            dictionary: Optional[bool] = None
+    ) -> Tuple[List[str], Iterator]:
+        """Execute a query with an unbuffered cursor, and stream the rows from the server in blocks of block_size.
+        Only one block is held in memory at a time.
+        Return the column names, and an iterator of the rows (tuples, or dicts if dictionary is True).
+        The result should be consumed (or the iterator closed) before the next query on this client.
+        """
+        conn = self.client
+        cur = conn.cursor(buffered=False, dictionary=dictionary)
+        cur.execute(sql, params=params)
+        columns = list(cur.column_names)
+        return columns, self._iter_blocks(conn, cur, block_size)
+
+    @staticmethod
+    def _iter_blocks(conn: MySQLConnection, cur: MySQLCursor, block_size: int):
+        try:
+            while rows := cur.fetchmany(block_size):
+                yield from rows
+        finally:
+            # The rest of an unbuffered result must be read out, otherwise the connection can't be reused.
+            # The connection owning the cursor is used, since the client may have been closed (or reconnected) since.
+            if getattr(conn, "unread_result", False):
+                conn.consume_results()
+            cur.close()
 
     def find(
             self,
             where: Optional[str] = None,
             projection: Union[List[str], str] = "*",
-            table: Optional[str] = None
+            table: Optional[str] = None,
+            block_size: int = DEFAULT_BLOCK_SIZE
     ):
+        """Stream the rows (as dicts) of a table, block_size rows at a time."""
         if not table:
             table = self.table
         if not table:
             raise ValueError("Table should be given.")
 
+        if not isinstance(projection, str):
+            projection = ", ".join(projection)
         sql = f"SELECT {projection} FROM {table}"
         if where:
             sql += " WHERE " + where
         sql += ";"
-        with self.execute(sql, dictionary=True) as cur:
-            for doc in cur:
-                yield doc
-            ret = cur.close()
-            return ret
+        _, rows = self.stream(sql, block_size=block_size, dictionary=True)
+        yield from rows
 
     def insert(self, doc_or_docs: dict | list[dict], table: Optional[str] = None):
         if isinstance(doc_or_docs, list):
@@ -219,8 +316,8 @@ class LazyMySQLClient(LazyClient[MySQLConnection]):
         placeholders = ", ".join(placeholders)
 
         sql = f"INSERT INTO {table} ({fields}) VALUES ({placeholders});"
-        cur = self.execute(sql, params=values)
-        return cur.close()
+        self.execute_prepared(sql, values)
+        return True
 
     def insert_many(self, docs: List[Dict[str, Any]], table: Optional[str] = None):
         if not docs:
@@ -247,6 +344,53 @@ class LazyMySQLClient(LazyClient[MySQLConnection]):
         cur = self.execute(sql, params=params)
         return cur.close()
 
+    def load_data(
+            self,
+            docs: Iterable[Mapping[str, Any]],
+            fields: Sequence[str],
+            table: Optional[str] = None
+    ) -> int:
+        """Bulk load documents by "LOAD DATA LOCAL INFILE".
+        The values of the given fields are written to a temporary TSV file, which is then sent to the server.
+        The client should be created with allow_local_infile, and the server should enable local_infile.
+        Return the number of loaded rows.
+        """
+        if not table:
+            table = self.table
+        if not table:
+            raise ValueError("Table should be given.")
+
+        with tempfile.NamedTemporaryFile(
+                "w",
+                suffix=".tsv",
+                encoding="utf-8",
+                newline="",
+                delete=False
+        ) as f:
+            path = f.name
+            try:
+                for doc in docs:
+                    f.write("\t".join(_to_tsv_value(doc.get(field)) for field in fields))
+                    f.write("\n")
+            except Exception:
+                f.close()
+                os.remove(path)
+                raise
+
+        try:
+            field_list = ", ".join(f"`{field}`" for field in fields)
+            sql = (
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE `{table}` CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' "
+                f"({field_list});"
+            )
+            cur = self.execute(sql, params=(path,))
+            num_rows = cur.rowcount
+            cur.close()
+            return num_rows
+        finally:
+            os.remove(path)
+
     # noinspection PyShadowingBuiltins
     def update(self, set: str, where: str, table: Optional[str] = None):
         if not table:
@@ -270,6 +414,23 @@ class LazyMySQLClient(LazyClient[MySQLConnection]):
 
 
 class MySQLIterator(DocIterator):
+    """Iterator over the rows of a MySQL table.
+    Rows are streamed with an unbuffered cursor, block_size rows at a time, so that memory stays bounded on large
+    tables. With as_tuple, rows are returned as tuples, and the column names are shared in columns (available once the
+    first row is returned), which avoids building a dict for each row.
+
+    With partitions > 1, the range between the MIN and MAX of the key (key_field, "id" by default) is split evenly, and
+    the ranges are streamed in parallel, each by a thread with its own pooled connection.
+    Rows of the ranges are merged as they arrive, so the order of the rows is not preserved.
+    For distributed workers, rank and world_size select the ranges of this worker, so that the workers together scan
+    the table exactly once.
+    The key should be an int, float or datetime column without NULLs, such as the primary key.
+
+    URL example:
+        mysql://host/db/table?partitions=8&rank=0&world_size=4
+    """
+
+    QUEUE_SIZE = 4096
 
     @classmethod
     def from_url(cls, url: Union[str, URL]):
@@ -278,42 +439,158 @@ class MySQLIterator(DocIterator):
             raise ValueError(f"Unsupported scheme '{url.scheme}'.")
         return cls(url)
 
-    def __init__(self, url: Union[str, URL]):
+    def __init__(
+            self,
+            url: Union[str, URL],
+            block_size: int = DEFAULT_BLOCK_SIZE,
+            as_tuple: bool = False,
+            key_field: str = "id",
+            partitions: int = 1,
+            rank: int = 0,
+            world_size: int = 1
+    ):
         super().__init__()
 
         url = URL.ensure_url(url)
+        self.url = url
         self.client = LazyMySQLClient.from_url(url)
         _, self.table = url.get_database_and_table()
 
+        if url.parameters:
+            params = url.parameters
+            if "block_size" in params:
+                block_size = int(params["block_size"])
+            elif "blockSize" in params:
+                block_size = int(params["blockSize"])
+
+            if "as_tuple" in params:
+                as_tuple = params["as_tuple"].lower() in {"true", "1"}
+            elif "asTuple" in params:
+                as_tuple = params["asTuple"].lower() in {"true", "1"}
+
+            if "key_field" in params:
+                key_field = params["key_field"]
+            elif "keyField" in params:
+                key_field = params["keyField"]
+
+        partitions, rank, world_size = parse_partition_params(url.parameters, partitions, rank, world_size)
+
+        self.block_size = block_size
+        self.as_tuple = as_tuple
+        self.key_field = key_field
+        self.partitions = partitions
+        self.rank = rank
+        self.world_size = world_size
+        self.columns: Optional[List[str]] = None
+
+        self._ranges = None
         self._cursor = None
         self._exhausted = False
         self._count = None
 
+    def split_ranges(self, n: int) -> List[Tuple[Any, Any]]:
+        """Split the key space evenly between the min and max keys into (at most) n ranges [lower, upper), where None
+        means unbounded."""
+        if n <= 1:
+            return [(None, None)]
+
+        sql = f"SELECT MIN({self.key_field}), MAX({self.key_field}) FROM {self.table};"
+        with self.client.execute(sql, buffered=True) as cur:
+            lower, upper = cur.fetchone()
+
+        if lower is None:
+            keys = []
+        elif isinstance(lower, datetime) and isinstance(upper, datetime):
+            keys = [lower + (upper - lower) * i / n for i in range(1, n)]
+        elif isinstance(lower, int) and isinstance(upper, int):
+            keys = [lower + (upper - lower + 1) * i // n for i in range(1, n)]
+        elif isinstance(lower, (int, float)) and isinstance(upper, (int, float)):
+            keys = [lower + (upper - lower) * i / n for i in range(1, n)]
+        else:
+            raise ValueError(f"Keys of type \"{type(lower).__name__}\" can't be split into ranges.")
+
+        return ranges_from_bounds(keys)
+
+    def get_ranges(self) -> List[Tuple[Any, Any]]:
+        """The key ranges scanned by this worker."""
+        if self._ranges is None:
+            self._ranges = select_ranges(self.split_ranges, self.partitions, self.rank, self.world_size)
+        return self._ranges
+
+    def _range_query(self, select: str, lower, upper) -> Tuple[str, tuple]:
+        conds = []
+        params = []
+        if lower is not None:
+            conds.append(f"{self.key_field} >= %s")
+            params.append(lower)
+        if upper is not None:
+            conds.append(f"{self.key_field} < %s")
+            params.append(upper)
+        sql = f"SELECT {select} FROM {self.table}"
+        if conds:
+            sql += " WHERE " + " AND ".join(conds)
+        sql += ";"
+        return sql, tuple(params)
+
     def __len__(self):
         if self._count is None:
-            sql = f"SELECT COUNT(*) FROM {self.table};"
-            with self.client.execute(sql) as cur:
-                self._count = cur.fetchone()[0]
+            # A separate connection is used, since the streaming one can't run another query before it is consumed.
+            with LazyMySQLClient.from_url(self.url) as client:
+                count = 0
+                for lower, upper in self.get_ranges():
+                    sql, params = self._range_query("COUNT(*)", lower, upper)
+                    with client.execute(sql, params=params, buffered=True) as cur:
+                        count += cur.fetchone()[0]
+                self._count = count
         return self._count
 
     def __iter__(self):
         if self._cursor is None:
             proj = ",".join(self.fields) if self.fields else "*"
-            sql = f"SELECT {proj} FROM {self.table};"
-            self._cursor = self.client.execute(sql, dictionary=True)
+            ranges = self.get_ranges()
+            if len(ranges) == 1:
+                sql, params = self._range_query(proj, *ranges[0])
+                self.columns, self._cursor = self.client.stream(
+                    sql,
+                    params=params or None,
+                    block_size=self.block_size,
+                    dictionary=not self.as_tuple
+                )
+            else:
+                # No range (e.g., an empty table for an extra worker) gives an empty iterator.
+                self._cursor = merge_range_scans(
+                    ranges,
+                    lambda lower, upper: self._scan_range(lower, upper, proj),
+                    self.QUEUE_SIZE
+                )
             self._exhausted = False
         return self
 
+    def _scan_range(self, lower, upper, proj):
+        # Each range is streamed with its own client, so that it gets its own connection from the pool.
+        with LazyMySQLClient.from_url(self.url) as client:
+            sql, params = self._range_query(proj, lower, upper)
+            self.columns, rows = client.stream(
+                sql,
+                params=params or None,
+                block_size=self.block_size,
+                dictionary=not self.as_tuple
+            )
+            try:
+                yield from rows
+            finally:
+                rows.close()
+
     def __next__(self):
         if self._exhausted:
             raise StopIteration()
 
-        doc = self._cursor.fetchone()
-        if doc is None:
+        try:
+            return next(self._cursor)
+        except StopIteration:
             self._exhausted = True
             self.close()
-            raise StopIteration()
-        return doc
+            raise
 
     def close(self):
         if getattr(self, "_cursor", None) is not None:
@@ -332,6 +609,16 @@ class MySQLIterator(DocIterator):
 
 
 class MySQLReader(DocReader):
+    """Reader for MySQL tables.
+    Rows are indexed by the keys (key_field) in ascending order.
+    Slices and lists of indices are served by "WHERE key IN (...)" queries of batch_size keys.
+    Iteration pages through the table by the key ("WHERE key > ? ORDER BY key LIMIT batch_size") on a separate
+    connection, with the next page read ahead in background.
+    With use_cache, documents are kept in a bounded cache (see libdata.cache), which is configured by the cache
+    parameters of the URL (cache_policy, cache_size, cache_bytes, cache_ttl), or given directly by cache.
+    """
+
+    DEFAULT_BATCH_SIZE = 256
 
     @classmethod
     def from_url(cls, url: Union[str, URL]):
@@ -347,12 +634,17 @@ class MySQLReader(DocReader):
     def __init__(
             self,
             url: Union[str, URL],
-            key_field="id"
+            key_field="id",
+            use_cache: bool = False,
+            cache: Optional[Cache] = None,
+            batch_size: int = DEFAULT_BATCH_SIZE
     ) -> None:
         url = URL.ensure_url(url)
+        self.url = url
         self.client = LazyMySQLClient.from_url(url)
         _, self.table = url.get_database_and_table()
 
+        cache_kwargs = {}
         if url.parameters:
             params = url.parameters
             if "key_field" in params:
@@ -360,24 +652,91 @@ class MySQLReader(DocReader):
             elif "keyField" in params:
                 key_field = params["keyField"]
 
+            if "use_cache" in params:
+                use_cache = params["use_cache"].lower() in {"true", "1"}
+            elif "useCache" in params:
+                use_cache = params["useCache"].lower() in {"true", "1"}
+
+            cache_kwargs = pop_cache_params(dict(params))
+
+            if "batch_size" in params:
+                batch_size = int(params["batch_size"])
+            elif "batchSize" in params:
+                batch_size = int(params["batchSize"])
+
         self.key_field = key_field
+        self.batch_size = batch_size
+        self.use_cache = use_cache or cache is not None
+        self.cache = None
+        if self.use_cache:
+            self.cache = cache if cache is not None else create_cache(**cache_kwargs)
 
         self.key_list = self._fetch_keys()
 
-    def _fetch_keys(self):
-        sql = f"SELECT {self.key_field} FROM {self.table};"
+    def _fetch_keys(self) -> KeyStore:
+        sql = f"SELECT {self.key_field} FROM {self.table} ORDER BY {self.key_field};"
         with self.client.execute(sql) as cur, self.client:
-            key_list = [row[0] for row in tqdm(cur, leave=False)]
+            key_list = KeyStore.from_iterable(row[0] for row in tqdm(cur, leave=False))
         return key_list
 
     def __len__(self):
         return len(self.key_list)
 
-    def __getitem__(self, idx: int):
-        key = self.key_list[idx]
-        sql = f"SELECT * FROM {self.table} WHERE {self.key_field}='{key}';"
-        with self.client.execute(sql, dictionary=True, buffered=True) as cur:
-            return cur.fetchone()
+    def __getitem__(self, idx: Union[int, slice, Sequence[int]]):
+        if isinstance(idx, slice):
+            return self.get_many(range(len(self))[idx])
+        elif not isinstance(idx, int) and isinstance(idx, Iterable):
+            return self.get_many(idx)
+        return self.read(self.key_list[idx])
+
+    def get_many(self, indices: Iterable[int]) -> List[Optional[dict]]:
+        """Get the rows of the given indices, in the same order.
+        The keys are queried in batches of batch_size with "IN". None is returned for a missing row.
+        """
+        key_list = [self.key_list[idx] for idx in indices]
+
+        docs = {}
+        missing = []
+        for key in key_list:
+            if key in docs:
+                continue
+            if self.use_cache and (doc := self.cache.get(key, MISSING)) is not MISSING:
+                docs[key] = doc
+            else:
+                docs[key] = None
+                missing.append(key)
+
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            placeholders = ", ".join(["%s"] * len(batch))
+            sql = f"SELECT * FROM {self.table} WHERE {self.key_field} IN ({placeholders});"
+            for doc in self.client.execute_prepared(sql, batch, dictionary=True).fetchall():
+                docs[doc[self.key_field]] = doc
+
+        if self.use_cache:
+            for key in missing:
+                self.cache.put(key, docs[key])
+        return [docs[key] for key in key_list]
+
+    def _fetch_page(self, client: LazyMySQLClient, after=None) -> List[dict]:
+        if after is None:
+            sql = f"SELECT * FROM {self.table} ORDER BY {self.key_field} LIMIT %s;"
+            params = (self.batch_size,)
+        else:
+            sql = f"SELECT * FROM {self.table} WHERE {self.key_field} > %s ORDER BY {self.key_field} LIMIT %s;"
+            params = (after, self.batch_size)
+        return client.execute_prepared(sql, params, dictionary=True).fetchall()
+
+    def __iter__(self):
+        # Pages are fetched by a background thread with its own connection, since connections are not thread safe.
+        with LazyMySQLClient.from_url(self.url) as client, ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(self._fetch_page, client)
+            while future is not None:
+                docs = future.result()
+                future = None
+                if len(docs) == self.batch_size:
+                    future = executor.submit(self._fetch_page, client, docs[-1][self.key_field])
+                yield from docs
 
     def close(self):
         if hasattr(self, "client"):
@@ -387,12 +746,34 @@ class MySQLReader(DocReader):
         self.close()
 
     def read(self, key):
-        sql = f"SELECT * FROM {self.table} WHERE {self.key_field}='{key}';"
-        with self.client.execute(sql, dictionary=True, buffered=True) as cur:
-            return cur.fetchone()
+        if self.use_cache and (doc := self.cache.get(key, MISSING)) is not MISSING:
+            return doc
+
+        sql = f"SELECT * FROM {self.table} WHERE {self.key_field} = %s;"
+        rows = self.client.execute_prepared(sql, (key,), dictionary=True).fetchall()
+        doc = rows[0] if rows else None
+
+        if self.use_cache:
+            self.cache.put(key, doc)
+        return doc
 
 
 class MySQLWriter(DocWriter):
+    """Writer for MySQL tables.
+
+    Documents are buffered, and each full buffer (buffer_size documents) is flushed in one transaction, by multi-row
+    INSERTs of the documents with the same fields. Each INSERT is kept under half of max_allowed_packet (values may
+    double in size when escaped).
+    The table and its columns are looked up once and then cached. The table is created from the first buffer if it
+    doesn't exist, and the columns missing from the table are added by one ALTER TABLE per flush.
+    With bulk_load, the buffers are loaded by "LOAD DATA LOCAL INFILE" instead of INSERTs, which needs local_infile to
+    be enabled on the server. Larger buffers (DEFAULT_BULK_BUFFER_SIZE by default) are used in this mode, and binary
+    values are not supported.
+    stats() reports the number of flushes and rows, and the rows written per second.
+    """
+
+    DEFAULT_BUFFER_SIZE = 512
+    DEFAULT_BULK_BUFFER_SIZE = 65536
 
     @classmethod
     def from_url(cls, url: Union[str, URL]):
@@ -408,48 +789,136 @@ class MySQLWriter(DocWriter):
     def __init__(
             self,
             url: Union[str, URL],
-            verbose: bool = True
+            verbose: bool = False,
+            buffer_size: Optional[int] = None,
+            max_packet_size: Optional[int] = None,
+            bulk_load: bool = False
     ):
         url = URL.ensure_url(url)
-        self.client = LazyMySQLClient.from_url(url)
         _, self.table = url.get_database_and_table()
 
-        self.verbose = verbose
+        if url.parameters:
+            params = url.parameters
+            if "buffer_size" in params:
+                buffer_size = int(params["buffer_size"])
+            elif "bufferSize" in params:
+                buffer_size = int(params["bufferSize"])
 
-        self._table_exists = None
+            if "bulk_load" in params:
+                bulk_load = params["bulk_load"].lower() in {"true", "1"}
+            elif "bulkLoad" in params:
+                bulk_load = params["bulkLoad"].lower() in {"true", "1"}
 
-    def write(self, doc: Mapping[str, Any]):
-        if not self.client.table_exists(self.table):
-            self.create_table_from_doc(doc)
+        if buffer_size is None:
+            buffer_size = self.DEFAULT_BULK_BUFFER_SIZE if bulk_load else self.DEFAULT_BUFFER_SIZE
 
-        fields = []
-        placeholders = []
-        values = []
-        for k, v in doc.items():
-            fields.append(k)
-            placeholders.append("%s")
-            values.append(v)
-        fields = ", ".join(fields)
-        placeholders = ", ".join(placeholders)
+        self.client = LazyMySQLClient(url, allow_local_infile=True if bulk_load else None)
+        self.verbose = verbose
+        self.buffer_size = buffer_size
+        self.max_packet_size = max_packet_size
+        self.bulk_load = bulk_load
 
-        sql = f"INSERT INTO {self.table} ({fields}) VALUES ({placeholders});"
-        cur = self.client.execute(sql, params=values)
-        return cur.close()
+        self._buffer = []
+        self._columns: Optional[set] = None
+
+        self._num_flushes = 0
+        self._num_rows = 0
+        self._total_time = 0.0
+
+    def write(self, doc: Mapping[str, Any]):
+        self._buffer.append(doc)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+
+        # DDL statements commit implicitly, so the schema is updated before the transaction.
+        self._update_schema(batch)
+
+        start_time = time.perf_counter()
+        self.client.start_transaction()
+        try:
+            if self.bulk_load:
+                # One file for the whole buffer, with NULL for the fields missing from a document.
+                fields = list(dict.fromkeys(field for doc in batch for field in doc))
+                self.client.load_data(batch, fields, self.table)
+            else:
+                groups: Dict[tuple, List[Mapping[str, Any]]] = {}
+                for doc in batch:
+                    groups.setdefault(tuple(doc), []).append(doc)
+                for docs in groups.values():
+                    self._insert(docs)
+            self.client.commit()
+        except Exception:
+            self.client.rollback()
+            raise
+
+        self._num_flushes += 1
+        self._num_rows += len(batch)
+        self._total_time += time.perf_counter() - start_time
+
+    def _insert(self, docs: List[Mapping[str, Any]]):
+        max_size = self._get_max_packet_size() // 2
+        chunk = []
+        chunk_size = 0
+        for doc in docs:
+            size = _estimate_row_size(doc)
+            if chunk and chunk_size + size > max_size:
+                self.client.insert_many(chunk, self.table)
+                chunk = []
+                chunk_size = 0
+            chunk.append(doc)
+            chunk_size += size
+        self.client.insert_many(chunk, self.table)
+
+    def stats(self) -> Mapping[str, float]:
+        return {
+            "flushes": self._num_flushes,
+            "rows": self._num_rows,
+            "rows_per_second": self._num_rows / self._total_time if self._total_time > 0 else 0.0,
+        }
+
+    def _get_max_packet_size(self) -> int:
+        if self.max_packet_size is None:
+            with self.client.execute("SELECT @@max_allowed_packet;", buffered=True) as cur:
+                self.max_packet_size = int(cur.fetchone()[0])
+        return self.max_packet_size
+
+    def _update_schema(self, batch: List[Mapping[str, Any]]):
+        # The first non-None value of each field decides the column type.
+        sample = {}
+        for doc in batch:
+            for field, value in doc.items():
+                if sample.get(field) is None:
+                    sample[field] = value
+
+        if self._columns is None:
+            sql = (
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = DATABASE() AND table_name = %s;"
+            )
+            rows = self.client.execute_prepared(sql, (self.table,)).fetchall()
+            # Column names are case-insensitive in MySQL.
+            self._columns = {row[0].lower() for row in rows}
+            if not self._columns:
+                self.create_table_from_doc(sample)
+                self._columns = {"id", *(field.lower() for field in sample)}
+                return
+
+        missing = [field for field in sample if field.lower() not in self._columns]
+        if missing:
+            columns = ", ".join(f"ADD COLUMN `{field}` {_column_type(sample[field])}" for field in missing)
+            cur = self.client.execute(f"ALTER TABLE `{self.table}` {columns};")
+            cur.close()
+            self._columns.update(field.lower() for field in missing)
+            if self.verbose:
+                print(f"Columns {missing} are added to table \"{self.table}\".", file=sys.stderr)
 
     def create_table_from_doc(self, doc: Mapping[str, Any]):
-        fields = []
-        for field, value in doc.items():
-            _type = "TEXT"
-            if isinstance(value, int):
-                _type = "BIGINT"
-            elif isinstance(value, float):
-                _type = "DOUBLE"
-            elif isinstance(value, bool):
-                _type = "BOOLEAN"
-            elif isinstance(value, datetime):
-                _type = "DATETIME"
-            fields.append((field, _type))
-        fields = ", ".join(f"`{field}` {_type}" for field, _type in fields)
+        fields = ", ".join(f"`{field}` {_column_type(value)}" for field, value in doc.items())
 
         sql = (
             f"CREATE TABLE IF NOT EXISTS `{self.table}` ("
@@ -462,8 +931,92 @@ class MySQLWriter(DocWriter):
         return cur.close()
 
     def close(self):
-        if hasattr(self, "client"):
+        if getattr(self, "client", None) is None:
+            return
+        try:
+            self.flush()
+            if self.verbose and self._num_rows > 0:
+                stats = self.stats()
+                print(
+                    f"{stats['rows']} rows are written to table \"{self.table}\" "
+                    f"({stats['rows_per_second']:.1f} rows/s).",
+                    file=sys.stderr
+                )
+        finally:
             self.client.close()
+            self.client = None
 
+    # noinspection PyBroadException
     def __del__(self):
-        self.close()
+        # Only the connection is released. Writing from a finalizer is unreliable (e.g., at interpreter exit), so the
+        # buffered documents are dropped if the writer is not closed.
+        try:
+            if getattr(self, "client", None) is not None:
+                if self._buffer:
+                    print(
+                        f"{len(self._buffer)} buffered rows of table \"{self.table}\" are dropped, "
+                        f"since the writer is not closed.",
+                        file=sys.stderr
+                    )
+                self.client.close()
+                self.client = None
+        except Exception:
+            pass
+
+
+def _column_type(value) -> str:
+    """The column type used for the values of a field when a table is created or altered."""
+    if isinstance(value, bool):
+        return "BOOLEAN"
+    elif isinstance(value, int):
+        return "BIGINT"
+    elif isinstance(value, float):
+        return "DOUBLE"
+    elif isinstance(value, datetime):
+        return "DATETIME"
+    return "TEXT"
+
+
+_TSV_ESCAPES = str.maketrans({
+    "\\": "\\\\",
+    "\t": "\\t",
+    "\n": "\\n",
+    "\r": "\\r",
+    "\0": "\\0",
+})
+
+
+def _to_tsv_value(value) -> str:
+    """Format a value for "LOAD DATA", with the default escapes of MySQL, consistent with _column_type().
+    Values that can't be inserted (containers, NaN and infinities, timezone-aware datetimes) and binary values raise
+    errors, instead of being loaded as text.
+    """
+    if value is None:
+        return "\\N"
+    elif isinstance(value, bool):
+        return "1" if value else "0"
+    elif isinstance(value, int):
+        return str(value)
+    elif isinstance(value, float):
+        if not math.isfinite(value):
+            raise ValueError(f"Non-finite value {value} can't be written to MySQL.")
+        return repr(value)
+    elif isinstance(value, datetime):
+        if value.tzinfo is not None:
+            raise ValueError(f"Timezone-aware datetime {value} can't be written to a DATETIME column.")
+        # Fractional seconds are kept, and are rounded by the server to the precision of the column.
+        return value.isoformat(" ")
+    elif isinstance(value, (bytes, bytearray)):
+        # The file is read in utf8mb4, which can't carry arbitrary bytes.
+        raise TypeError("Binary values can't be written by \"LOAD DATA\", write BLOB columns without bulk_load.")
+    elif isinstance(value, (dict, list, tuple, set, frozenset)):
+        raise TypeError(f"Value of type \"{type(value).__name__}\" can't be written to MySQL.")
+    return str(value).translate(_TSV_ESCAPES)
+
+
+def _estimate_row_size(doc: Mapping[str, Any]) -> int:
+    """Estimate the bytes of a row in an INSERT statement."""
+    size = 4
+    for value in doc.values():
+        size += (len(value) if isinstance(value, (bytes, bytearray)) else len(str(value).encode("utf-8"))) + 4
+    return size
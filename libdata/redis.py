@@ -176,24 +176,25 @@ class LazyRedisStandalone(LazyRedisClient, LazyClient[Redis]):
     DEFAULT_CONN_POOL = ConnectionPool[Redis](DEFAULT_CONN_POOL_SIZE)
 
     def _connect(self):
-        client = self._conn_pool.get(self._conn_key)
-        if client is None:
-            # noinspection PyPackageRequirements
-            client = Redis(
-                host=self.hostname,
-                port=self.port,
-                username=self.username,
-                password=self.password,
-                db=self.database,
-                decode_responses=True,
-                **self.kwargs
-            )
-        return client
+        return self._conn_pool.acquire(self._conn_key, self._create_client, ping=Redis.ping)
+
+    def _create_client(self):
+        # noinspection PyPackageRequirements
+        return Redis(
+            host=self.hostname,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            db=self.database,
+            decode_responses=True,
+            **self.kwargs
+        )
 
     def _disconnect(self, client):
-        client = self._conn_pool.put(self._conn_key, client)
-        if client is not None:
-            client.close()
+        self._conn_pool.release(self._conn_key, client)
+
+    def _get_pool(self):
+        return self._conn_pool, self._conn_key
 
     def get_client(self, read=False):
         return self.client
@@ -226,28 +227,38 @@ class LazyRedisSentinel(LazyRedisClient, LazyClient[Tuple[Redis, Redis]]):
     DEFAULT_CONN_POOL = ConnectionPool[Tuple[Redis, Redis]](DEFAULT_CONN_POOL_SIZE)
 
     def _connect(self):
-        client = self._conn_pool.get(self._conn_key)
-        if client is None:
-            # noinspection PyPackageRequirements
-            from redis import Sentinel
-            sentinel = Sentinel(self.sentinels, socket_timeout=self.socket_timeout)
-            kwargs = dict(
-                service_name=self.service_name,
-                db=self.database,
-                username=self.username,
-                password=self.password
-            )
-            master = sentinel.master_for(**kwargs)
-            slave = sentinel.slave_for(**kwargs, decode_responses=True)
-            client = (master, slave)
-        return client
+        return self._conn_pool.acquire(
+            self._conn_key,
+            self._create_client,
+            close=self._close_client,
+            ping=lambda client: client[0].ping()
+        )
+
+    def _create_client(self):
+        # noinspection PyPackageRequirements
+        from redis import Sentinel
+        sentinel = Sentinel(self.sentinels, socket_timeout=self.socket_timeout)
+        kwargs = dict(
+            service_name=self.service_name,
+            db=self.database,
+            username=self.username,
+            password=self.password
+        )
+        master = sentinel.master_for(**kwargs)
+        slave = sentinel.slave_for(**kwargs, decode_responses=True)
+        return master, slave
+
+    @staticmethod
+    def _close_client(client):
+        master, slave = client
+        master.close()
+        slave.close()
 
     def _disconnect(self, client):
-        client = self._conn_pool.put(self._conn_key, client)
-        if client is not None:
-            master, slave = client
-            master.close()
-            slave.close()
+        self._conn_pool.release(self._conn_key, client)
+
+    def _get_pool(self):
+        return self._conn_pool, self._conn_key
 
     def get_client(self, read=False):
         return self.client[int(read)]
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+
+__author__ = "xi"
+__all__ = [
+    "ShardedReader",
+    "shard_length",
+]
+
+import glob
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+
+from libdata.codec import is_utf8
+from libdata.common import DocReader
+from libdata.compression import decompress_stream, get_compression
+from libdata.index import INDEX_SUFFIX, file_signature, read_index
+from libdata.url import URL
+
+DEFAULT_MAX_OPEN_SHARDS = 64
+
+
+def shard_length(url: Union[str, URL]) -> int:
+    """Count the documents of a shard without creating its reader.
+    Local JSON Lines shards are counted by their sidecar indexes (if up to date), or by scanning their lines.
+    Other shards are opened to get their lengths.
+    """
+    url = URL.ensure_url(url)
+    if url.scheme == "jsonl" and url.path and os.path.isfile(url.path):
+        # Imported here, since libdata.jsonl depends on this module.
+        from libdata.jsonl import count_lines
+
+        if (result := read_index(url.path + INDEX_SUFFIX)) is not None:
+            meta, arrays = result
+            if meta.get("signature") == file_signature(url.path) and "offsets" in arrays:
+                return len(arrays["offsets"]) - 1
+
+        params = url.parameters or {}
+        if is_utf8(params.get("encoding", "UTF-8")):
+            compression = get_compression(url.path, params.get("compression"))
+            with open(url.path, "rb") as raw, decompress_stream(raw, compression) as f:
+                return count_lines(f)
+
+    reader = DocReader.from_url(url)
+    try:
+        return len(reader)
+    finally:
+        if hasattr(reader, "close"):
+            reader.close()
+
+
+class _OpenShard:
+    __slots__ = ("reader", "refs", "evicted")
+
+    def __init__(self, reader: DocReader):
+        self.reader = reader
+        self.refs = 0
+        self.evicted = False
+
+
+class ShardedReader(DocReader):
+    """Present many shards (e.g., "part-00042.jsonl") as one indexable reader.
+
+    A global index is mapped to (shard, local index) by binary search over the cumulative lengths of the shards.
+    Shards are opened on demand, and at most max_open_shards of them are kept open (least recently used first out).
+    An evicted shard which is still being read by another thread is closed once it's released.
+    The lengths of the shards are counted without opening them (see shard_length()), unless lengths are given.
+
+    URL examples:
+        jsonl:///path/of/part-*.jsonl?lazy=true
+        shards:///path/of/part-*.jsonl.zst?lazy=true&max_open_shards=16
+    Parameters other than max_open_shards are passed to the reader of each shard.
+    """
+
+    @classmethod
+    def from_url(cls, url: Union[str, URL]):
+        url = URL.ensure_url(url)
+
+        if url.scheme not in {"shards", "json", "jsonl", "yaml", "yml"}:
+            raise ValueError(f"Unsupported scheme \"{url.scheme}\".")
+        if not url.path:
+            raise ValueError("The path pattern of the shards should be given.")
+
+        params = dict(url.parameters or {})
+        max_open_shards = int(params.pop("max_open_shards", DEFAULT_MAX_OPEN_SHARDS))
+
+        # Sidecar indexes (e.g., "part-0.jsonl.idx") are not shards.
+        path_list = sorted(path for path in glob.glob(url.path) if not path.endswith(INDEX_SUFFIX))
+        if not path_list:
+            raise FileNotFoundError(f"No shard matches \"{url.path}\".")
+
+        shard_urls = [
+            URL(
+                scheme=cls._scheme_by_extension(path) if url.scheme == "shards" else url.scheme,
+                path=path,
+                parameters=params
+            )
+            for path in path_list
+        ]
+        return ShardedReader(shard_urls, max_open_shards=max_open_shards)
+
+    @staticmethod
+    def _scheme_by_extension(path: str) -> str:
+        # The reader is chosen the same way as for remote files, then mapped back to a local scheme.
+        schemes = {
+            "libdata.jsonl.JSONLReader": "jsonl",
+            "libdata.json.JSONReader": "json",
+        }
+        scheme = schemes.get(DocReader._reader_by_extension(path))
+        if scheme is None:
+            raise ValueError(f"Unsupported shard \"{path}\".")
+        return scheme
+
+    def __init__(
+            self,
+            shards: Sequence[Union[str, URL]],
+            max_open_shards: int = DEFAULT_MAX_OPEN_SHARDS,
+            lengths: Optional[Sequence[int]] = None
+    ):
+        if max_open_shards < 1:
+            raise ValueError("max_open_shards should be at least 1.")
+        self.shards: List[URL] = [URL.ensure_url(shard) for shard in shards]
+        self.max_open_shards = max_open_shards
+
+        self._open_shards = OrderedDict()
+        self._lock = Lock()
+
+        if lengths is None:
+            with ThreadPoolExecutor() as executor:
+                lengths = list(executor.map(shard_length, self.shards))
+        elif len(lengths) != len(self.shards):
+            raise ValueError("lengths should have the same size as shards.")
+        self.offsets = np.zeros((len(self.shards) + 1,), dtype=np.int64)
+        np.cumsum(lengths, out=self.offsets[1:])
+
+    @contextmanager
+    def _use_shard(self, shard_idx: int):
+        """Check out the reader of a shard, which is not closed until it's released."""
+        entry = self._acquire_shard(shard_idx)
+        try:
+            yield entry.reader
+        finally:
+            self._release_shard(entry)
+
+    def _acquire_shard(self, shard_idx: int) -> _OpenShard:
+        with self._lock:
+            entry = self._open_shards.get(shard_idx)
+            if entry is not None:
+                self._open_shards.move_to_end(shard_idx)
+                entry.refs += 1
+                return entry
+
+        # Opening a shard may take long (e.g., an eager reader), so it's done without holding the lock.
+        reader = DocReader.from_url(self.shards[shard_idx])
+        to_close = []
+        with self._lock:
+            entry = self._open_shards.get(shard_idx)
+            if entry is not None:
+                # Opened by another thread meanwhile.
+                to_close.append(reader)
+                self._open_shards.move_to_end(shard_idx)
+            else:
+                entry = self._open_shards[shard_idx] = _OpenShard(reader)
+                while len(self._open_shards) > self.max_open_shards:
+                    _, evicted = self._open_shards.popitem(last=False)
+                    evicted.evicted = True
+                    if evicted.refs == 0:
+                        to_close.append(evicted.reader)
+            entry.refs += 1
+        for reader in to_close:
+            self._close_shard(reader)
+        return entry
+
+    def _release_shard(self, entry: _OpenShard):
+        with self._lock:
+            entry.refs -= 1
+            unused = entry.evicted and entry.refs == 0
+        if unused:
+            self._close_shard(entry.reader)
+
+    @staticmethod
+    def _close_shard(reader: DocReader):
+        if hasattr(reader, "close"):
+            reader.close()
+
+    def locate(self, idx: int):
+        """Map a global index to (shard index, local index)."""
+        size = len(self)
+        if idx < 0:
+            idx += size
+        if not 0 <= idx < size:
+            raise IndexError(f"Index {idx} is out of range.")
+        shard_idx = int(np.searchsorted(self.offsets, idx, side="right")) - 1
+        return shard_idx, idx - int(self.offsets[shard_idx])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, idx: int):
+        shard_idx, local_idx = self.locate(idx)
+        with self._use_shard(shard_idx) as reader:
+            return reader[local_idx]
+
+    def read(self, key):
+        for shard_idx in range(len(self.shards)):
+            try:
+                with self._use_shard(shard_idx) as reader:
+                    return reader.read(key)
+            except KeyError:
+                continue
+        raise KeyError(key)
+
+    def close(self):
+        if getattr(self, "_open_shards", None) is not None:
+            to_close = []
+            with self._lock:
+                while self._open_shards:
+                    _, entry = self._open_shards.popitem()
+                    entry.evicted = True
+                    if entry.refs == 0:
+                        to_close.append(entry.reader)
+            for reader in to_close:
+                self._close_shard(reader)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __getstate__(self):
+        # Open shards are not transferred to other processes, they will be reopened on demand.
+        state = self.__dict__.copy()
+        state["_open_shards"] = OrderedDict()
+        state["_lock"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
@@ -7,15 +7,44 @@ __all__ = [
 ]
 
 import os
-from typing import Optional, Union
+from typing import Optional, TextIO, Union
 
 import yaml
 
 from libdata.common import DocReader, DocWriter
+from libdata.index import DirIndex
 from libdata.url import URL
 
 
+def read_yaml_field(f: TextIO, field: str):
+    """Read a top-level field of the YAML mapping in a file.
+    The file is parsed event by event, and parsing stops once the field is found.
+    """
+    loader = yaml.SafeLoader(f)
+    try:
+        # Skip StreamStartEvent and DocumentStartEvent.
+        loader.get_event()
+        loader.get_event()
+        if not loader.check_event(yaml.MappingStartEvent):
+            raise ValueError("The document should be a YAML mapping.")
+        loader.get_event()
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = loader.construct_object(loader.compose_node(None, None), deep=True)
+            value_node = loader.compose_node(None, None)
+            if key == field:
+                return loader.construct_object(value_node, deep=True)
+        raise KeyError(field)
+    finally:
+        loader.dispose()
+
+
 class YAMLDirReader(DocReader):
+    """Reader for a directory of files, each of which contains one document.
+
+    With use_index, the file list and the key index are persisted to a sidecar file (see libdata.index.DirIndex).
+    The directory is listed, and the key index is built, by a pool of workers threads.
+    To build the key index, each file is only parsed until key_field is found.
+    """
 
     @classmethod
     def from_url(cls, url: Union[str, URL]):
@@ -24,14 +53,22 @@ class YAMLDirReader(DocReader):
         if not url.scheme in {"yamldir", "ymldir"}:
             raise ValueError(f"Unsupported scheme \"{url.scheme}\".")
 
-        return YAMLDirReader(dir_path=url.path, **url.parameters)
+        params = dict(url.parameters or {})
+        if "use_index" in params:
+            params["use_index"] = params["use_index"].lower() in {"true", "1"}
+        if "workers" in params:
+            params["workers"] = int(params["workers"])
+
+        return YAMLDirReader(dir_path=url.path, **params)
 
     def __init__(
             self,
             dir_path: str,
             encoding: str = "UTF-8",
             key_field: Optional[str] = None,
-            recursive: bool = True
+            recursive: bool = True,
+            use_index: bool = False,
+            workers: Optional[int] = None
     ) -> None:
         if not os.path.isdir(dir_path):
             raise ValueError(f"\"{dir_path}\" should be a directory.")
@@ -39,19 +76,15 @@ class YAMLDirReader(DocReader):
         self.encoding = encoding
         self.key_field = key_field
         self.recursive = recursive
+        self.use_index = use_index
+        self.workers = workers
 
-        self.file_list = []
-        self._get_file_list(self.dir_path)
-        self.index = None
+        self._dir_index = DirIndex(self.dir_path, self.recursive, self.use_index, self.workers)
+        self.file_list = self._dir_index.file_list
 
-    def _get_file_list(self, dir_path: str):
-        for filename in os.listdir(dir_path):
-            path = os.path.join(dir_path, filename)
-            if os.path.isdir(path):
-                if self.recursive:
-                    self._get_file_list(path)
-            else:
-                self.file_list.append(path)
+    def _read_key(self, path: str):
+        with open(path, "rt", encoding=self.encoding) as f:
+            return read_yaml_field(f, self.key_field)
 
     def __len__(self):
         return len(self.file_list)
@@ -67,13 +100,7 @@ class YAMLDirReader(DocReader):
             if not path.endswith(".json"):
                 path += ".json"
         else:
-            if self.index is None:
-                self.index = {}
-                for path in self.file_list:
-                    with open(path, "rt", encoding=self.encoding) as f:
-                        doc = yaml.safe_load(f)
-                        self.index[doc[self.key_field]] = path
-            path = self.index[key]
+            path = self._dir_index.find(key, self.key_field, self._read_key)
 
         with open(path, "rt", encoding=self.encoding) as f:
             return yaml.safe_load(f)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+__author__ = "xi"
+
+import os
+import tempfile
+
+from bson import ObjectId
+
+from libdata.keys import KeyStore
+
+# The last byte is NUL, which numpy "S" arrays would strip.
+NUL_TERMINATED_ID = ObjectId(bytes.fromhex("65f0a1b2c3d4e5f607080900"))
+
+
+def test_objectid_with_trailing_nul():
+    ids = [ObjectId(), NUL_TERMINATED_ID, ObjectId(bytes(12))]
+    keys = KeyStore.from_iterable(ids)
+    assert keys.kind == "objectid"
+    assert len(keys) == 3
+    assert list(keys) == ids
+    assert keys[1] == NUL_TERMINATED_ID
+    assert keys[-1] == ids[-1]
+
+
+def test_objectid_save_load():
+    ids = [NUL_TERMINATED_ID, ObjectId()]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "keys.npz")
+        assert KeyStore.from_iterable(ids).save(path, count=2)
+        keys = KeyStore.load(path, count=2)
+        assert keys is not None
+        assert list(keys) == ids
+        assert KeyStore.load(path, count=3) is None
+
+
+def test_int_and_str_keys():
+    assert list(KeyStore.from_iterable([3, 1, 2])) == [3, 1, 2]
+    assert list(KeyStore.from_iterable(["a", "", "中文"])) == ["a", "", "中文"]
+    assert list(KeyStore.from_iterable([1, "a"])) == [1, "a"]